@@ -40,9 +40,9 @@ class Make_Eyelink(Eyelink):
                 pass
         return None
 
-    # returns always true since we only expect one eyelink
+    # we only expect one eyelink: any file that was not converted from SMI fits
     def fits(self, input_file: str) -> bool:
-        return True
+        return readHeader(input_file).eyetracker != 'SMI'
 
     def isResponse(self, line: Line) -> bool :
         return len(line) >= 5 and 'END' in line[2] and 'TRANSITION' in line[3] and 'TIMEOUT' in line[4]
@@ -78,8 +78,12 @@ class Exp(Experiment):
         self.expected_features = {'training', 'target_side'}
 
     def createEyetracker(self, input_file: str) -> Eyetracker:
-        logTrace ('Selecting Eyelink', Precision.NORMAL)
-        return Make_Eyelink()
+        eyelink = Make_Eyelink()
+        if eyelink.fits(input_file):
+            logTrace ('Selecting Eyelink', Precision.NORMAL)
+            return eyelink
+        logTrace ('No suitable eyetracker found for input file %s' % input_file, Precision.ERROR)
+        raise ExperimentException('No suitable eyetracker found for input file %s' % input_file)
 
     def processTrial(self, subject: Subject, trial, filename = None):
         pass
@@ -489,30 +493,14 @@ class Exp(Experiment):
 
     def parseSubject(self, input_file : str, eyetracker : Eyetracker, progress = None) -> Subject:
 
-        with open(input_file) as f:
-            first_line = f.readline()
-            if first_line[-1] == '\n':
-                first_line = first_line[:-1]
-
-        subject_data = self.getSubjectData(first_line)
+        subject_data = self.getSubjectData(readHeader(input_file).subject_line)
 
         if subject_data is None:
             raise ExperimentException('Subject number and category could not be found')
 
         else:
-            result_file = 'results.txt'
-            is_processed = eyetracker.preprocess(input_file, result_file, progress)
-            if is_processed:
-                datafile = open(joinPaths(getTmpFolder(), result_file), 'r')
-            else:
-                datafile = open(input_file, 'r')
-
-            #File conversion in list.
-            data = datafile.read()
-            data = list(data.splitlines())
-
-            #We add a tabulation and space separator.
-            data = [re.split('[\t ]+',line) for line in data]
+            #File conversion in list, preprocessed by the eyetracker if needed. Samples are converted in bulk, other lines are split on tabulations and spaces.
+            data = eyetracker.getLines(input_file, progress)
 
             (n_subject, subject_cat) = subject_data
             return Subject(eyetracker, self.n_trials, data, n_subject, subject_cat, progress)
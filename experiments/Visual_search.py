@@ -77,12 +77,7 @@ class Make_Eyelink(Eyelink):
         return None
 
     def fits(self, input_file : str) -> bool:
-        with open(input_file, "r") as file:
-            lines = file.readlines()
-            for n, line in enumerate(lines):
-                if n >= 100: return False
-                if 'EYELINK' in line: return True
-            return False
+        return readHeader(input_file).eyetracker == 'Eyelink'
 
 
     def isResponse(self, line: Line) -> bool :
@@ -157,12 +152,7 @@ class Make_Smi(Smi):
         return None
 
     def fits(self, input_file : str) -> bool:
-        with open(input_file, "r") as file:
-            lines = file.readlines()
-            for n, line in enumerate(lines):
-                if n >= 100: return False
-                if 'IDF Converter' in line: return True
-            return False
+        return readHeader(input_file).eyetracker == 'SMI'
 
     def isResponse(self, line: Line) -> bool :
         return len(line) >= 8 and 'sujet' in line[6]
@@ -716,37 +706,20 @@ class Exp(Experiment):
         except:
             return None
 
-    default_subject_id = 1
     default_category = 'Not defined'
     #default_category = 'SAS'
 
     def parseSubject(self, input_file : str, eyetracker: Eyetracker, progress = None) -> Subject:
 
-        with open(input_file) as f:
-            first_line = f.readline()
-            if first_line[-1] == '\n':
-                first_line = first_line[:-1]
-
-        subject_data = self.getSubjectData(first_line)
+        subject_data = self.getSubjectData(readHeader(input_file).subject_line)
 
         if subject_data is None:
             logTrace ('Subject number and category could not be found', Precision.ERROR)
-            subject_data = (Exp.default_subject_id, Exp.default_category)
-            Exp.default_subject_id += 1
-
-        result_file = "results.txt"
-        is_processed = eyetracker.preprocess(input_file, result_file, progress)
-        if is_processed:
-            datafile = open(joinPaths(getTmpFolder(), result_file), "r")
-        else:
-            datafile = open(input_file, "r")
-
-        #File conversion in list.
-        data = datafile.read()
-        data = list(data.splitlines())
+            # The subject is given a default number by processSubject(s)
+            subject_data = (None, Exp.default_category)
 
-        #We add a tabulation and space separator.
-        data = [re.split("[\t ]+",line) for line in data]
+        #File conversion in list, preprocessed by the eyetracker if needed. Samples are converted in bulk, other lines are split on tabulations and spaces.
+        data = eyetracker.getLines(input_file, progress)
 
         (n_subject, subject_cat) = subject_data
         return Subject(eyetracker, self.n_trials, data, n_subject, subject_cat, progress)
@@ -71,16 +71,8 @@ class Make_Eyelink(Eyelink):
         return None
 
     def fits(self, input_file : str) -> bool:
-        with open(input_file, "r") as file:
-            lines = file.readlines()
-            # First line is subject
-            screen_info = lines[1]
-            for coord in allowed_coordinates:
-                if "MSG SCREEN_CENTER_INFO %i %i"%(coord[0], coord[1]) in screen_info:
-                    if self.screen_center == coord:
-                        return True
-                    break
-            return False
+        screen_center = readHeader(input_file).screen_center
+        return screen_center in allowed_coordinates and self.screen_center == screen_center
 
     def isResponse(self, line: Line) -> bool :
         return len(line) >= 2 and 'END' in line[0] and 'SAMPLES' in line[2]
@@ -218,13 +210,14 @@ class Exp(Experiment):
         #     total_neu_fixation_time = None
         #     percent_neu_fixation_time = None
         total_target_fix_times = dict()
+        region_fixation_index = EntryListIndex(region_fixations)
         for i in range(8):
             my_fix_time = dict()
             my_fix_time[1] = 0 # fix on emotional image
             my_fix_time[0] = 0 # fix on neutral image
-            for fixation in region_fixations:
-                if fixation.getStartTimeFromStartTrial() <= (i+1)*1000 and fixation.getEndTimeFromStartTrial() >= i*1000:
-                    my_fix_time[fixation.on_target] += min((i+1)*1000, fixation.getEndTimeFromStartTrial()) - max(i*1000, fixation.getStartTimeFromStartTrial())
+            # Fixations overlapping the i-th second of the trial
+            for fixation in region_fixation_index.getOverlapping(start_trial_time + i*1000, start_trial_time + (i+1)*1000):
+                my_fix_time[fixation.on_target] += min((i+1)*1000, fixation.getEndTimeFromStartTrial()) - max(i*1000, fixation.getStartTimeFromStartTrial())
             try:
                 total_target_fix_times[i] = my_fix_time[first_image_to_look == "EMO"]/(my_fix_time[0]+my_fix_time[1])*100
             except ZeroDivisionError:
@@ -953,30 +946,14 @@ class Exp(Experiment):
 
     def parseSubject(self, input_file : str, eyetracker: Eyetracker, progress = None) -> Subject:
 
-        with open(input_file) as f:
-            first_line = f.readline()
-            if first_line[-1] == '\n':
-                first_line = first_line[:-1]
-
-        subject_data = self.getSubjectData(first_line)
+        subject_data = self.getSubjectData(readHeader(input_file).subject_line)
 
         if subject_data is None:
             raise ExperimentException('Subject number and category could not be found')
 
         else:
-            result_file = "results.txt"
-            is_processed = eyetracker.preprocess(input_file, result_file, progress)
-            if is_processed:
-                datafile = open(joinPaths(getTmpFolder(), result_file), "r")
-            else:
-                datafile = open(input_file, "r")
-
-            #File conversion in list.
-            data = datafile.read()
-            data = list(data.splitlines())
-
-            #We add a tabulation and space separator.
-            data = [re.split("[\t ]+",line) for line in data]
+            #File conversion in list, preprocessed by the eyetracker if needed. Samples are converted in bulk, other lines are split on tabulations and spaces.
+            data = eyetracker.getLines(input_file, progress)
 
             (n_subject, subject_cat) = subject_data
             subject = Subject(eyetracker, self.n_trials, data, n_subject, subject_cat, progress)
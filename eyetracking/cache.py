@@ -0,0 +1,138 @@
+import glob, hashlib, importlib, os, pickle
+from functools import lru_cache
+
+from eyetracking.utils import *
+
+# Modules that parse and preprocess the subjects (the modules of the
+# experiment and eyetracker classes are added to them). Cache keys depend on
+# their source, so that subjects are parsed again when the code changes.
+parsing_modules = [
+    'eyetracking.utils',
+    'eyetracking.entry',
+    'eyetracking.header',
+    'eyetracking.samples',
+    'eyetracking.trial',
+    'eyetracking.subject',
+    'eyetracking.eyetracker',
+    'eyetracking.eyelink',
+    'eyetracking.smi',
+    'eyetracking.smi_correction',
+    'eyetracking.interest_region',
+    'eyetracking.experiment'
+]
+
+def describe(value) -> str:
+    """
+    Returns a description of the given value that only depends on its
+    content (unlike repr, which may contain memory addresses).
+    """
+    if isinstance(value, dict):
+        return '{%s}' % ', '.join('%s: %s' % (describe(k), describe(v)) for (k, v) in sorted(value.items(), key = lambda item: str(item[0])))
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        items = sorted(value, key = str) if isinstance(value, (set, frozenset)) else value
+        return '%s(%s)' % (type(value).__name__, ', '.join(describe(v) for v in items))
+    elif hasattr(value, '__dict__') and not callable(value):
+        return '%s.%s%s' % (type(value).__module__, type(value).__qualname__, describe(vars(value)))
+    else:
+        return repr(value)
+
+def getFileHash(input_file: str) -> str:
+    file_hash = hashlib.sha256()
+    with open(input_file, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            file_hash.update(block)
+    return file_hash.hexdigest()
+
+# Source files are hashed once per session: the code that runs is the code
+# that was imported.
+@lru_cache(maxsize = 128)
+def getSourceHash(module_name: str) -> str:
+    module = importlib.import_module(module_name)
+    source_file = getattr(module, '__file__', None)
+    if source_file is None:
+        return module_name
+    return getFileHash(source_file)
+
+def getCodeHash(experiment, eyetracker) -> str:
+    """
+    Returns a hash of the source of the modules that parse subjects for the
+    given experiment and eyetracker: the parsing modules, and the modules of
+    their classes and base classes.
+    """
+    modules = list(parsing_modules)
+    for cls in type(experiment).__mro__ + type(eyetracker).__mro__:
+        if cls.__module__ not in modules and cls.__module__ not in ('builtins', 'abc'):
+            modules.append(cls.__module__)
+    code_hash = hashlib.sha256()
+    for module in modules:
+        code_hash.update(('%s %s\n' % (module, getSourceHash(module))).encode())
+    return code_hash.hexdigest()
+
+def getSubjectKey(input_file: str, experiment, eyetracker) -> str:
+    """
+    Returns the cache key of a subject file: it depends on the content of
+    the file, the experiment, the eyetracker configuration, the
+    preprocessing parameters and the parsing code.
+    The key begins with a hash of the path of the file and of the experiment,
+    which is shared by all the versions of the subject (see saveSubject).
+    """
+    experiment_name = '%s.%s' % (type(experiment).__module__, type(experiment).__qualname__)
+    source = '\n'.join([
+        os.path.abspath(input_file),
+        experiment_name
+    ])
+    key = '\n'.join([
+        getCodeHash(experiment, eyetracker),
+        getFileHash(input_file),
+        experiment_name,
+        describe(eyetracker),
+        describe(eyetracker.getPreprocessingParameters())
+    ])
+    return '%s_%s' % (hashlib.sha256(source.encode()).hexdigest()[:16], hashlib.sha256(key.encode()).hexdigest())
+
+def getCacheFile(key: str) -> str:
+    return joinPaths(getCacheFolder(), '%s.pickle' % key)
+
+def removeStaleSubjects(key: str) -> None:
+    """
+    Removes the cached versions of the subject with the given key that were
+    saved with another key (older code, file content or parameters): they
+    cannot be read anymore.
+    """
+    source = key.split('_')[0]
+    for cache_file in glob.glob(joinPaths(getCacheFolder(), '%s_*.pickle' % source)):
+        if cache_file != getCacheFile(key):
+            try:
+                os.remove(cache_file)
+            except OSError as e:
+                logTrace('Cached subject %s could not be removed: %s' % (cache_file, str(e)), Precision.ERROR)
+
+def loadSubject(key: str):
+    """
+    Returns the cached subject with the given key, or None.
+    """
+    cache_file = getCacheFile(key)
+    if not os.path.exists(cache_file):
+        return None
+    try:
+        with open(cache_file, 'rb') as f:
+            return pickle.load(f)
+    except Exception as e:
+        logTrace('Cached subject %s could not be read: %s' % (cache_file, str(e)), Precision.ERROR)
+        return None
+
+# Only the last version of each subject is kept in the cache folder.
+def saveSubject(key: str, subject) -> None:
+    createCacheFolder()
+    cache_file = getCacheFile(key)
+    # Writing to a temporary file first, so that a cached subject is always complete
+    tmp_file = '%s.%i.tmp' % (cache_file, os.getpid())
+    try:
+        with open(tmp_file, 'wb') as f:
+            pickle.dump(subject, f, protocol = pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, cache_file)
+        removeStaleSubjects(key)
+    except Exception as e:
+        logTrace('Subject could not be cached: %s' % str(e), Precision.ERROR)
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
@@ -1,5 +1,6 @@
-from typing import Tuple, TypeVar, Union
+from typing import List, Tuple, TypeVar, Union
 import math, random
+import numpy as np
 from eyetracking.utils import *
 
 class EntryException(Exception):
@@ -108,6 +109,29 @@ class StartTrial(Entry):
 class StopTrial(Entry):
     "Stop Trial"
 
+# Codes of the entry classes in the kind column of trials (see Trial).
+entry_kinds = [Position,
+    StartTrial,
+    StopTrial,
+    StartFixation,
+    EndFixation,
+    StartSaccade,
+    EndSaccade,
+    StartBlink,
+    EndBlink,
+    Response,
+    Message,
+    TrialFeatures]
+position_kind = 0
+other_kind = len(entry_kinds)
+kind_codes = {klass: kind for (kind, klass) in enumerate(entry_kinds)}
+
+def getKind(entry: Entry) -> int:
+    for (kind, klass) in enumerate(entry_kinds):
+        if isinstance(entry, klass):
+            return kind
+    return other_kind
+
 class EntryListException(Exception):
     def __init__(self, message):
 
@@ -143,35 +167,37 @@ class EntryList:
         return self.end
 
     def getStartTime(self) -> int:
-        return self.getEntry(self.getBegin()).getTime()
+        return int(self.trial.time[self.getBegin()])
 
     def getEndTime(self) -> int:
-        return self.getEntry(self.getEnd()).getTime()
+        return int(self.trial.time[self.getEnd()])
 
     def getEntry(self, line : int) -> Entry:
         if line <= self.end and line >= self.begin:
-            return self.trial.entries[line]
+            return self.trial.getEntry(line)
         else:
             raise EntryListException('Index %i out of bound' % line)
 
+    # Indices of the positions between the given lines (end excluded)
+    def getPositionIndices(self, begin: int, end: int) -> np.ndarray:
+        return np.flatnonzero(self.trial.kind[begin:end] == position_kind) + begin
+
     def getFirstGazePosition(self) -> Union[Point, None]:
-        for i in range(self.begin + 1, self.end - 1):
-            p = self.getEntry(i).getGazePosition()
-            if p != None:
-                return p
-        return None
+        positions = self.getPositionIndices(self.begin + 1, self.end - 1)
+        if len(positions) == 0:
+            return None
+        return self.trial.getGazePosition(positions[0])
 
     def getLastGazePosition(self) -> Union[Point, None]:
-        for i in reversed(range(self.begin + 1, self.end - 1)):
-            p = self.getEntry(i).getGazePosition()
-            if p != None:
-                return p
-        return None
+        positions = self.getPositionIndices(self.begin + 1, self.end - 1)
+        if len(positions) == 0:
+            return None
+        return self.trial.getGazePosition(positions[-1])
 
     def duration(self) -> int:
         if self.begin == None or self.end == None:
             return 0
-        return self.getEntry(self.getEnd()).getTime() - self.getEntry(self.getBegin()).getTime()
+        return self.getEndTime() - self.getStartTime()
 
     def raiseException(self, e):
         if self.ENTRYLISTEXCEPTION_WARNING:
@@ -184,26 +210,29 @@ class EntryList:
             raise EntryListException("Entry list is too short")
 
     def checkTimes(self) -> None:
+        time = self.trial.time
         # Time must increase for all lines except the first and last ones.
-        for i in range(self.begin+1, self.end-2):
-            if self.getEntry(i).getTime() > self.getEntry(i+1).getTime():
-                self.raiseException(
-                    EntryListException(
-                        'Time is decreasing between %s and %s' % (
-                            str(self.getEntry(i)),
-                            str(self.getEntry(i+1))
-                        )
+        decreasing = []
+        if self.end - self.begin > 3:
+            decreasing = (np.flatnonzero(time[self.begin+1:self.end-2] > time[self.begin+2:self.end-1]) + self.begin + 1).tolist()
+        for i in decreasing:
+            self.raiseException(
+                EntryListException(
+                    'Time is decreasing between %s and %s' % (
+                        str(self.getEntry(i)),
+                        str(self.getEntry(i+1))
                     )
                 )
+            )
 
         # The first line must give the time of the second one
-        if (self.getEntry(self.begin+1).getTime() - self.getEntry(self.begin).getTime()) > 2 :
+        if (time[self.begin+1] - time[self.begin]) > 2 :
             self.raiseException(
                 EntryListException('Incorrect time for the first line: %s' % self.entries_to_string())
             )
 
         # The last line must give the time of the prevous one
-        if (self.getEntry(self.end).getTime() - self.getEntry(self.end-1).getTime()) > 2:
+        if (time[self.end] - time[self.end-1]) > 2:
             self.raiseException(
                 EntryListException('Incorrect time for the last line %s' % str(self.getEntry(self.end)))
             )
@@ -216,25 +245,52 @@ class EntryList:
         self.end = reg2.end
 
     def barycentre(self) -> Point:
-        i_line = self.begin
-        counter = 0
-        # We look for the first point
-        while i_line <= self.end and self.getEntry(i_line).getGazePosition() == None:
-            i_line += 1
-        if i_line <= self.end:
-            (x,y) = self.getEntry(i_line).getGazePosition()
-            counter = 1
-            i_line += 1
-        while i_line <= self.end:
-            if self.getEntry(i_line).getGazePosition() != None:
-                (x2,y2) = self.getEntry(i_line).getGazePosition()
-                x += x2
-                y += y2
-                counter += 1
-            i_line += 1
-
+        positions = self.getPositionIndices(self.begin, self.end + 1)
+        counter = len(positions)
+        # Sums are cumulated in order, as point by point
+        x = np.cumsum(self.trial.x[positions])[-1].item()
+        y = np.cumsum(self.trial.y[positions])[-1].item()
         return (x / counter, y / counter)
 
+class EntryListIndex:
+    """
+    Index of entry lists (e.g. fixations) by time, to find those of a time
+    window by bisection. Entry lists are expected in time order; if they are
+    not, queries scan them all.
+    """
+    def __init__(self, entry_lists: List[EntryList]):
+        self.entry_lists = entry_lists
+        self.begins = np.array([entry_list.getBegin() for entry_list in entry_lists], dtype = np.int64)
+        self.start_times = np.array([entry_list.getStartTime() for entry_list in entry_lists], dtype = np.int64)
+        self.end_times = np.array([entry_list.getEndTime() for entry_list in entry_lists], dtype = np.int64)
+        # Latest end time up to each entry list: it increases even if entry lists overlap
+        self.max_end_times = np.maximum.accumulate(self.end_times) if len(entry_lists) > 0 else self.end_times
+        self.is_sorted = bool(np.all(self.start_times[:-1] <= self.start_times[1:]) and np.all(self.begins[:-1] <= self.begins[1:]))
+
+    def __len__(self) -> int:
+        return len(self.entry_lists)
+
+    # Returns the entry lists that overlap the window [t0, t1] (bounds included).
+    def getOverlapping(self, t0: int, t1: int) -> List[EntryList]:
+        if self.is_sorted:
+            candidates = range(np.searchsorted(self.max_end_times, t0, 'left'), np.searchsorted(self.start_times, t1, 'right'))
+        else:
+            candidates = range(len(self.entry_lists))
+        return [self.entry_lists[i] for i in candidates if self.start_times[i] <= t1 and self.end_times[i] >= t0]
+
+    # Returns the first entry list starting after t, or None.
+    def getFirstAfter(self, t: int) -> Union[EntryList, None]:
+        if self.is_sorted:
+            i = np.searchsorted(self.start_times, t, 'right')
+            return self.entry_lists[i] if i < len(self.entry_lists) else None
+        return next((self.entry_lists[i] for i in range(len(self.entry_lists)) if self.start_times[i] > t), None)
+
+    # Returns the entry lists beginning before the given entry index.
+    def getBeginningBefore(self, line: int) -> List[EntryList]:
+        if self.is_sorted:
+            return self.entry_lists[:np.searchsorted(self.begins, line, 'left')]
+        return [entry_list for entry_list in self.entry_lists if entry_list.getBegin() < line]
+
 class FixationException(Exception):
     def __init__(self, message):
 
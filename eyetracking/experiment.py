@@ -1,9 +1,13 @@
 import attr
+import multiprocessing, os
 from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from typing import List, Dict, Union
 
 from eyetracking.utils import *
 from eyetracking.subject import *
+from eyetracking.header import *
+from eyetracking.cache import getSubjectKey, loadSubject, saveSubject
 
 class ExperimentException(Exception):
     def __init__(self, message):
@@ -13,6 +17,15 @@ class ExperimentException(Exception):
 
 class Experiment (ABC):
 
+    # Parsed subjects are kept in the cache folder, and reused as long as
+    # the subject file, the eyetracker and the preprocessing do not change.
+    use_cache = True
+
+    # Number given to the next subject whose file does not give it. Subjects
+    # are parsed (or read from the cache) with None as number, and numbered
+    # in the order of their files, by the process that asked for them.
+    default_subject_id = 1
+
     def __init__(self):
         self.expected_features = set()
         self.eyetrackers = []
@@ -42,14 +55,93 @@ class Experiment (ABC):
         self.eyetrackers.append(eyetracker)
         return eyetracker
 
+    # Returns true if one of the eyetrackers of this experiment can read the file
+    def fits(self, input_file: str) -> bool:
+        try:
+            self.determineEyetracker(input_file)
+            return True
+        except ExperimentException:
+            return False
+
     def processSubject(self, input_file: str, progress_bar = None) -> Subject:
+        subject = self.readSubject(input_file, progress_bar)
+        self.setDefaultSubjectId(subject)
+        return subject
+
+    # Parses the subject file, or reads it from the cache, without giving it a
+    # default number (see setDefaultSubjectId).
+    def readSubject(self, input_file: str, progress_bar = None) -> Subject:
         eyetracker = self.determineEyetracker(input_file)
+        key = None
+        if self.use_cache:
+            key = getSubjectKey(input_file, self, eyetracker)
+            subject = loadSubject(key)
+            if subject is not None:
+                logTrace('Subject file %s read from cache' % input_file, Precision.NORMAL)
+                return subject
         subject = self.parseSubject(input_file, eyetracker, progress_bar)
         if self.isSubjectValid(subject):
+            if key is not None:
+                saveSubject(key, subject)
             return subject
         else:
             raise ExperimentException('File %s does not fit the experiment' % input_file)
 
+    def processSubjects(self, input_files: List[str], progress = None, n_processes: int = None) -> List[Subject]:
+        """
+        Parses several subject files, in a pool of n_processes processes
+        (getMaxProcesses() by default). Subjects are returned in the order of the
+        files, and the first progress bar is incremented for each of them.
+        Subjects that are in the cache are not sent to the pool.
+        """
+        subjects = [None] * len(input_files)
+        remaining = []
+        for (i, input_file) in enumerate(input_files):
+            if self.use_cache:
+                subjects[i] = loadSubject(getSubjectKey(input_file, self, self.determineEyetracker(input_file)))
+            if subjects[i] is None:
+                remaining.append(i)
+            elif progress != None:
+                logTrace('Subject file %s read from cache' % input_file, Precision.NORMAL)
+                progress.increment(0)
+
+        if n_processes is None:
+            n_processes = getMaxProcesses()
+        n_processes = min(n_processes, len(remaining))
+        if n_processes <= 1:
+            for i in remaining:
+                subjects[i] = self.readSubject(input_files[i], progress)
+                if progress != None:
+                    progress.increment(0)
+            return self.setDefaultSubjectIds(subjects)
+
+        # Processes are spawned rather than forked, since the GUI is running.
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(n_processes, mp_context = context) as executor:
+            futures = {executor.submit(self.readSubject, input_files[i]): i for i in remaining}
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    subjects[i] = future.result()
+                except Exception as e:
+                    for other in futures:
+                        other.cancel()
+                    raise ExperimentException('File %s could not be read: %s' % (input_files[i], e)) from e
+                logTrace('Subject file %s parsed' % input_files[i], Precision.NORMAL)
+                if progress != None:
+                    progress.increment(0)
+        return self.setDefaultSubjectIds(subjects)
+
+    def setDefaultSubjectId(self, subject : Subject) -> None:
+        if subject.id is None:
+            subject.setId(type(self).default_subject_id)
+            type(self).default_subject_id += 1
+
+    def setDefaultSubjectIds(self, subjects : List[Subject]) -> List[Subject]:
+        for subject in subjects:
+            self.setDefaultSubjectId(subject)
+        return subjects
+
     def recalibrate(self, subject : Subject) -> None:
         pass
 
@@ -74,3 +166,12 @@ class Experiment (ABC):
             logTrace('Expected features %s, got %s for trial 0' % (self.expected_features, features), Precision.ERROR)
             return False
         return True
+
+def suggestExperiments(experiments: Dict[str, Experiment], input_file: str) -> List[str]:
+    """
+    Returns the names of the experiments (as given by loadExperiments)
+    whose eyetrackers can read the given file. Only the header of the file
+    is read.
+    """
+    logTrace('%s' % readHeader(input_file), Precision.DETAIL)
+    return [name for (name, experiment) in experiments.items() if experiment.fits(input_file)]
@@ -3,6 +3,11 @@ from eyetracking.trial import *
 
 class Eyelink (Eyetracker):
 
+    # Columns of time, x, y and pupil size in sample lines (see readLines)
+    sample_columns = [0, 1, 2, 3]
+    # Samples have no type column
+    sample_type = None
+
     def __init__(self):
         pass
 
@@ -19,6 +24,41 @@ class Eyelink (Eyetracker):
     # Each of the following parser tries to parse one type of Entry
     # If is fails, it returns None
 
+    # Names of the parsers to try for a line, according to its first token.
+    # They are looked up on the instance, so that experiments can override them.
+    message_parsers = ['parseStartTrial',
+        'parseStopTrial',
+        'parseResponse',
+        'parseExperimentVariables',
+        'parseMessage']
+
+    entry_parsers = {
+        'MSG': message_parsers,
+        'SFIX': ['parseStartFixation'],
+        'EFIX': ['parseEndFixation'],
+        'SBLINK': ['parseStartBlink'],
+        'EBLINK': ['parseEndBlink'],
+        'SSACC': ['parseStartSaccade'],
+        'ESACC': ['parseEndSaccade']
+    }
+
+    # Samples start with their time
+    sample_parsers = ['parsePosition']
+
+    # Lines starting with any other token go through every parser
+    default_parsers = ['parseStartTrial',
+        'parseStopTrial',
+        'parsePosition',
+        'parseStartFixation',
+        'parseEndFixation',
+        'parseStartBlink',
+        'parseEndBlink',
+        'parseStartSaccade',
+        'parseEndSaccade',
+        'parseResponse',
+        'parseExperimentVariables',
+        'parseMessage']
+
     def parseStartTrial(self, line: List[str]) -> Union[Entry, None]:
         if len(line) >= 5 and line[2] == 'start_trial':
             try:
@@ -41,7 +81,8 @@ class Eyelink (Eyetracker):
 
     def parsePosition(self, line: List[str]) -> Union[Entry, None]:
         # case Position
-        if len(line) >= 3:
+        # Missing samples (during blinks) have '.' as coordinates
+        if len(line) >= 3 and line[1] != '.':
             try:
                 time = int(line[0])
                 x = float(line[1])
@@ -151,21 +192,13 @@ class Eyelink (Eyetracker):
 
 
     def parseEntry(self, line: List[str]) -> Union[Entry, None]:
-        parsers = [self.parseStartTrial,
-            self.parseStopTrial,
-            self.parsePosition,
-            self.parseStartFixation,
-            self.parseEndFixation,
-            self.parseStartBlink,
-            self.parseEndBlink,
-            self.parseStartSaccade,
-            self.parseEndSaccade,
-            self.parseResponse,
-            self.parseExperimentVariables,
-            self.parseMessage]
+        if line[0][:1].isdigit():
+            parsers = self.sample_parsers
+        else:
+            parsers = self.entry_parsers.get(line[0], self.default_parsers)
 
         for parser in parsers:
-            res = parser(line)
+            res = getattr(self, parser)(line)
             if res != None:
                 return res
 
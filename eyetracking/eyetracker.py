@@ -3,6 +3,7 @@ from abc import ABC, abstractmethod
 from typing import List, Dict, Union
 
 from eyetracking.entry import *
+from eyetracking.samples import *
 
 class Eyetracker (ABC):
 
@@ -39,3 +40,14 @@ class Eyetracker (ABC):
     @abstractmethod
     def preprocess(self, input_file: str, output_file: str) -> bool:
         pass
+
+    # Returns the lines of the given subject file (see readLines), preprocessed if needed.
+    def getLines(self, input_file: str, progress = None):
+        result_file = 'results.txt'
+        if self.preprocess(input_file, result_file, progress):
+            return readLines(joinPaths(getTmpFolder(), result_file), self)
+        return readLines(input_file, self)
+
+    # Returns the parameters used by preprocess, if any
+    def getPreprocessingParameters(self) -> Dict:
+        return {}
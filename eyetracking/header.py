@@ -0,0 +1,79 @@
+import os, re
+from functools import lru_cache
+from typing import List, Union
+
+from eyetracking.utils import *
+
+# The header of a subject file is made of its first lines, read at most once
+# per file (and per file modification).
+header_lines = 100
+header_size = 1 << 16
+
+class FileHeader:
+    """
+    First lines of a subject file, and the information they give:
+    eyetracker that recorded the file, screen center, subject line and
+    sample rate.
+    """
+    def __init__(self, lines: List[str]):
+        self.lines = lines
+        # First line is subject
+        self.subject_line = lines[0] if len(lines) > 0 else ''
+        # 'Eyelink', 'SMI' or None
+        self.eyetracker = None
+        if self.contains('EYELINK'):
+            self.eyetracker = 'Eyelink'
+        elif self.contains('IDF Converter'):
+            self.eyetracker = 'SMI'
+        self.screen_center = self.findScreenCenter()
+        self.sample_rate = self.findSampleRate()
+
+    def __str__(self):
+        return 'Header (%s, screen center %s, sample rate %s): %s' % (
+            self.eyetracker, self.screen_center, self.sample_rate, self.subject_line)
+
+    def contains(self, text: str) -> bool:
+        for line in self.lines:
+            if text in line:
+                return True
+        return False
+
+    def findScreenCenter(self) -> Union[Point, None]:
+        for line in self.lines:
+            match = re.search('SCREEN_CENTER_INFO[\t ]+([0-9]+)[\t ]+([0-9]+)', line)
+            if match is not None:
+                return (int(match.group(1)), int(match.group(2)))
+        return None
+
+    # Number of samples per second
+    def findSampleRate(self) -> Union[float, None]:
+        for line in self.lines:
+            # SMI: '## Sample Rate:	250', Eyelink: 'SAMPLES	GAZE	RIGHT	RATE	1000.00 ...'
+            match = re.search('(?:Sample Rate:|[\t ]RATE)[\t ]+([0-9.]+)', line)
+            if match is not None:
+                try:
+                    return float(match.group(1))
+                except ValueError:
+                    pass
+        return None
+
+def readHeader(input_file: str) -> FileHeader:
+    """
+    Returns the header of the given subject file.
+    Headers are kept in memory, so that all eyetrackers and experiments
+    testing the same file share one read of its first lines.
+    """
+    stat = os.stat(input_file)
+    return readFileHeader(os.path.abspath(input_file), stat.st_mtime_ns, stat.st_size)
+
+@lru_cache(maxsize = 256)
+def readFileHeader(input_file: str, mtime: int, size: int) -> FileHeader:
+    with openFile(input_file, 'rb') as f:
+        data = f.read(header_size)
+    lines = data.decode(errors = 'replace').split('\n')
+    if len(data) == header_size and len(lines) > 1:
+        # The last line may be cut
+        lines = lines[:-1]
+    elif lines[-1] == '':
+        lines = lines[:-1]
+    return FileHeader([line.rstrip('\r') for line in lines[:header_lines]])
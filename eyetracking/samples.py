@@ -0,0 +1,231 @@
+import io, mmap, os, re
+import numpy as np
+from typing import Iterable, Iterator, List, Union
+
+from eyetracking.utils import *
+
+# Size of the pieces of file that are converted at once (cut at line ends)
+chunk_size = 1 << 20
+
+def tokenize(line: str) -> List[str]:
+    return re.split("[\t ]+", line)
+
+class SampleBlock:
+    """
+    Run of consecutive sample lines of a subject file, converted in bulk.
+    Missing samples (e.g. during blinks) are not part of the block.
+    """
+    def __init__(self, time, x, y, pupil):
+        self.time = time
+        self.x = x
+        self.y = y
+        # Pupil size, NaN when not recorded
+        self.pupil = pupil
+
+    def __str__(self):
+        return 'SampleBlock of %i samples' % self.size()
+
+    def size(self) -> int:
+        return len(self.time)
+
+    # Returns the block of the samples from i to j (excluded)
+    def slice(self, i: int, j: int = None) -> 'SampleBlock':
+        return SampleBlock(self.time[i:j], self.x[i:j], self.y[i:j], self.pupil[i:j])
+
+def isWhitespace(a):
+    return (a == 32) | (a == 9) | (a == 13) | (a == 10)
+
+def parseChunk(data: bytes, eyetracker) -> List[Union[List[str], SampleBlock]]:
+    """
+    Converts a piece of file made of whole lines.
+    Sample lines are converted in one vectorized pass and returned as
+    SampleBlocks, the other lines are tokenized.
+    """
+    a = np.frombuffer(data, dtype=np.uint8)
+    ends = np.flatnonzero(a == 10)
+    starts = np.concatenate(([0], ends[:-1] + 1))
+
+    # Tokens of every line
+    space = isWhitespace(a)
+    token_start = ~space
+    token_start[1:] &= space[:-1]
+    n_tokens_before = np.cumsum(token_start, dtype=np.int32)
+    # Number of tokens before each line
+    line_offset = n_tokens_before[starts] - token_start[starts]
+    n_tokens = n_tokens_before[ends] - line_offset
+
+    columns = eyetracker.sample_columns
+    first_byte = a[starts]
+    is_sample = (first_byte >= 48) & (first_byte <= 57) & (n_tokens > max(columns))
+    if eyetracker.sample_type is not None:
+        # The second token gives the type of the line
+        token_positions = np.flatnonzero(token_start)
+        second = token_positions[np.minimum(line_offset + 1, len(token_positions) - 1)]
+        sample_type = eyetracker.sample_type.encode()
+        for (i, byte) in enumerate(sample_type + b' '):
+            if i < len(sample_type):
+                is_sample &= a[np.minimum(second + i, len(a) - 1)] == byte
+            else:
+                is_sample &= space[np.minimum(second + i, len(a) - 1)]
+
+    sample_lines = np.flatnonzero(is_sample)
+    if len(sample_lines) > 0:
+        sample_data = a[np.repeat(is_sample, ends - starts + 1)]
+        # Lines of the sample data
+        sample_starts = np.cumsum(np.concatenate(([0], (ends - starts + 1)[sample_lines[:-1]])))
+        sample_ends = sample_starts + (ends - starts)[sample_lines]
+
+        # Missing values are written '.': they are replaced by 0 and the sample is marked as missing.
+        missing = np.zeros(len(sample_lines), dtype=bool)
+        pupil_missing = np.zeros(len(sample_lines), dtype=bool)
+        sample_space = isWhitespace(sample_data)
+        dots = np.flatnonzero(sample_data == 46)
+        dots = dots[(dots > 0) & (dots < len(sample_data) - 1)]
+        dots = dots[sample_space[dots - 1] & sample_space[dots + 1]]
+        if len(dots) > 0:
+            sample_data = sample_data.copy()
+            sample_data[dots] = 48
+            i_lines = np.searchsorted(sample_ends, dots)
+            dot_columns = (n_tokens_before[starts[sample_lines[i_lines]] + (dots - sample_starts[i_lines])]
+                - line_offset[sample_lines[i_lines]] - 1)
+            missing[i_lines[(dot_columns == columns[0]) | (dot_columns == columns[1]) | (dot_columns == columns[2])]] = True
+            if len(columns) > 3:
+                pupil_missing[i_lines[dot_columns == columns[3]]] = True
+
+        try:
+            values = np.loadtxt(io.BytesIO(sample_data.tobytes()), usecols = columns, ndmin = 2, comments = None)
+        except ValueError as e:
+            logTrace('Samples could not be converted in bulk: %s' % str(e), Precision.ERROR)
+            values = None
+    else:
+        values = None
+
+    if values is None:
+        return [tokenize(line) for line in decodeLines(data, starts.tolist(), ends.tolist())]
+
+    time = values[:,0]
+    # Times of samples must be integers
+    keep = ~missing & (time == np.floor(time))
+    time = time[keep].astype(np.int64)
+    x = values[keep,1]
+    y = values[keep,2]
+    if len(columns) > 3:
+        pupil = values[keep,3]
+        pupil[pupil_missing[keep]] = np.nan
+    else:
+        pupil = np.full(len(time), np.nan)
+    # Index of each sample line among the kept samples
+    n_kept_before = np.concatenate(([0], np.cumsum(keep))).tolist()
+
+    # Runs of consecutive sample lines
+    breaks = np.flatnonzero(np.diff(sample_lines) > 1) + 1
+    run_begins = np.concatenate(([0], breaks)).tolist()
+    run_ends = np.concatenate((breaks, [len(sample_lines)])).tolist()
+    sample_lines = sample_lines.tolist()
+    starts = starts.tolist()
+    ends = ends.tolist()
+
+    result = []
+    i_line = 0
+    for (run_begin, run_end) in zip(run_begins, run_ends):
+        first_line = sample_lines[run_begin]
+        result += [tokenize(line) for line in decodeLines(data, starts[i_line:first_line], ends[i_line:first_line])]
+        begin = n_kept_before[run_begin]
+        end = n_kept_before[run_end]
+        if end > begin:
+            result.append(SampleBlock(time[begin:end], x[begin:end], y[begin:end], pupil[begin:end]))
+        i_line = sample_lines[run_end - 1] + 1
+    result += [tokenize(line) for line in decodeLines(data, starts[i_line:], ends[i_line:])]
+    return result
+
+def decodeLines(data: bytes, starts: List[int], ends: List[int]) -> List[str]:
+    return [data[start:end].decode(errors = 'replace').rstrip('\r') for (start, end) in zip(starts, ends)]
+
+def readLines(input_file: str, eyetracker) -> Iterator[Union[List[str], SampleBlock]]:
+    """
+    Reads a subject file lazily.
+    Yields its lines: tokenized lines for messages and events, and
+    SampleBlocks for runs of samples. The sample columns are given by the
+    sample_columns (time, x, y and optionally pupil) and sample_type
+    attributes of the eyetracker.
+    The file is memory-mapped (or decompressed as a stream if it is
+    compressed), and converted one chunk at a time when the lines are
+    consumed: only the current chunk is held in memory.
+    """
+    if isCompressed(input_file):
+        with openFile(input_file, 'rb') as f:
+            yield from readStream(f, eyetracker)
+        return
+    with open(input_file, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ) as data:
+            begin = 0
+            while begin < len(data):
+                end = data.rfind(b'\n', begin, begin + chunk_size) + 1
+                if end <= begin:
+                    end = data.find(b'\n', begin) + 1
+                if end <= begin:
+                    # Last line, without line end
+                    yield from parseChunk(data[begin:] + b'\n', eyetracker)
+                    break
+                yield from parseChunk(data[begin:end], eyetracker)
+                begin = end
+
+def readStream(f, eyetracker) -> Iterator[Union[List[str], SampleBlock]]:
+    # The end of each chunk, after its last line end, is kept for the next one.
+    rest = b''
+    while True:
+        data = f.read(chunk_size)
+        if len(data) == 0:
+            break
+        data = rest + data
+        end = data.rfind(b'\n') + 1
+        rest = data[end:]
+        if end > 0:
+            yield from parseChunk(data[:end], eyetracker)
+    if len(rest) > 0:
+        # Last line, without line end
+        yield from parseChunk(rest + b'\n', eyetracker)
+
+def groupSamples(lines: Iterable, eyetracker) -> Iterator[Union[List[str], SampleBlock]]:
+    """
+    Converts lines that are already split (e.g. lines preprocessed in
+    memory) as readLines converts the lines of a file: runs of sample lines
+    are yielded as SampleBlocks, and the other lines are tokenized again,
+    as if they were written in a file and read back.
+    Lines are lists of values, written as strings, or sample records with
+    time, x and y attributes, which are taken without conversion.
+    """
+    columns = eyetracker.sample_columns
+    # Samples of the current run
+    rows = []
+    for line in lines:
+        if not isinstance(line, list):
+            rows.append([line.time, line.x, line.y] + [np.nan] * (len(columns) - 3))
+            continue
+        if len(line) > max(columns) and str(line[0])[:1].isdigit() and (eyetracker.sample_type is None or line[1] == eyetracker.sample_type):
+            try:
+                rows.append([float(line[column]) if line[column] != '.' else np.nan for column in columns])
+                continue
+            except ValueError:
+                pass
+        if len(rows) > 0:
+            yield from toSampleBlocks(rows)
+            rows = []
+        yield tokenize('\t'.join([str(token) for token in line]))
+    if len(rows) > 0:
+        yield from toSampleBlocks(rows)
+
+def toSampleBlocks(rows: List[List[float]]) -> List[SampleBlock]:
+    values = np.array(rows, dtype=np.float64)
+    time = values[:,0]
+    # Times of samples must be integers, and samples with missing values are removed.
+    keep = ~np.isnan(values[:,:3]).any(axis = 1) & (time == np.floor(time))
+    if not np.any(keep):
+        return []
+    if values.shape[1] > 3:
+        pupil = values[keep,3]
+    else:
+        pupil = np.full(np.count_nonzero(keep), np.nan)
+    return [SampleBlock(time[keep].astype(np.int64), values[keep,1], values[keep,2], pupil)]
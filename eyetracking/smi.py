@@ -1,9 +1,15 @@
 from eyetracking.trial import *
 from eyetracking.eyelink import Eyelink
-from eyetracking.smi_correction import processSubject
+from eyetracking.smi_correction import processSubject, preprocessSubject
+from eyetracking import smi_correction
 
 class Smi (Eyetracker):
 
+    # Columns of time, x and y in sample lines (see readLines)
+    sample_columns = [0, 3, 4]
+    # Type given in the second column of sample lines
+    sample_type = 'SMP'
+
     def __init__(self):
         super().__init__()
 
@@ -22,6 +28,39 @@ class Smi (Eyetracker):
     # Each of the following parser tries to parse one type of Entry
     # If is fails, it returns None
 
+    # Names of the parsers to try for a line, according to its type: either
+    # the first token for events, or the token following the time for samples
+    # (SMP) and messages (MSG).
+    # They are looked up on the instance, so that experiments can override them.
+    entry_parsers = {
+        'SMP': ['parsePosition'],
+        'MSG': ['parseStartTrial',
+            'parseStopTrial',
+            'parseResponse',
+            'parseExperimentVariables',
+            'parseMessage'],
+        'SFIX': ['parseStartFixation'],
+        'EFIX': ['parseEndFixation'],
+        'SBLINK': ['parseStartBlink'],
+        'EBLINK': ['parseEndBlink'],
+        'SSACC': ['parseStartSaccade'],
+        'ESACC': ['parseEndSaccade']
+    }
+
+    # Lines of any other type go through every parser
+    default_parsers = ['parseStartTrial',
+        'parseStopTrial',
+        'parsePosition',
+        'parseStartFixation',
+        'parseEndFixation',
+        'parseStartBlink',
+        'parseEndBlink',
+        'parseStartSaccade',
+        'parseEndSaccade',
+        'parseResponse',
+        'parseExperimentVariables',
+        'parseMessage']
+
     def parseStartTrial(self, line: List[str]) -> Entry:
         if len(line) >= 8 and line[5] == 'start_trial':
             try:
@@ -136,26 +175,28 @@ class Smi (Eyetracker):
         return None
 
     def parseEntry(self, line: List[str]) -> Entry:
-        parsers = [self.parseStartTrial,
-            self.parseStopTrial,
-            self.parsePosition,
-            self.parseStartFixation,
-            self.parseEndFixation,
-            self.parseStartBlink,
-            self.parseEndBlink,
-            self.parseStartSaccade,
-            self.parseEndSaccade,
-            self.parseResponse,
-            self.parseExperimentVariables,
-            self.parseMessage]
-
-        for parser in parsers:
-            res = parser(line)
+        if line[0][:1].isdigit() and len(line) > 1:
+            line_type = line[1]
+        else:
+            line_type = line[0]
+
+        for parser in self.entry_parsers.get(line_type, self.default_parsers):
+            res = getattr(self, parser)(line)
             if res != None:
                 return res
 
         return None
 
+    # Writes the preprocessed subject in the temporary folder (the subjects are parsed from getLines)
     def preprocess(self, input_file: str, output_file: str, progress_bar = None) -> bool:
         processSubject(input_file, output_file, progress_bar)
         return True
+
+    # Preprocessed lines are given to the subject in memory, without temporary
+    # files, as each trial is preprocessed: the progress of the subject parsing
+    # is also the progress of the preprocessing.
+    def getLines(self, input_file: str, progress = None):
+        return groupSamples(preprocessSubject(input_file), self)
+
+    def getPreprocessingParameters(self) -> Dict:
+        return smi_correction.get_parameters()
@@ -1,8 +1,14 @@
 #This script is dedicated to smi. It filters raw data, writing a new file containing saccades, fixations and blinks which are calculated. It is for now focused on an accurate calculation of fixation according to dispersion and velocity parameters. Compared to the algorithm comprise in the SMI software, it takes into account artifacts and allows to consider both dispersion and velocity.
 import matplotlib.pyplot as plt
+import multiprocessing
+import numpy as np
 import re
 from math import pow,sqrt,atan2,degrees
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+from itertools import chain, product
 from string import *
+from typing import Iterator, List, Union
 
 from eyetracking.utils import *
 
@@ -18,17 +24,50 @@ min_blink_duration = 16
 min_velocity = 0.06
 #1000°/s. The eye must go through 37 px/ms to be above this threshold.
 max_velocity = 1
+#Parameters of the detection (see get_parameters)
+parameter_names = ['min_dispersion', 'size_screen', 'distance_ppt', 'monitor_resolution', 'min_fixation_duration', 'min_blink_duration', 'min_velocity', 'max_velocity']
+#Parameters the blink and artifact stages depend on (velocities depend on the screen). The fixation stage depends on all of them.
+blink_parameter_names = ['size_screen', 'distance_ppt', 'monitor_resolution', 'min_blink_duration', 'min_velocity']
+artifact_parameter_names = ['size_screen', 'distance_ppt', 'monitor_resolution', 'max_velocity']
+#Vectorized tests closer than this (relative) margin to their threshold are done again with the scalar functions, whose rounding may differ.
+threshold_margin = 1e-9
 
 #Reading files functions
-def get_inter_filename():
-    return "results_inter.txt"
-
-def two_decimals(s):
-    return "{:.2f}".format(float(s))
+#Returns the value as it is read back once written with two decimals
+def round_two_decimals(value):
+    return float("{:.2f}".format(value))
+
+#Kinds of samples: samples of the subject file, points interpolated over artifacts, points of the saccades between fixations, and points added before fixations that follow long saccades.
+sample_kinds = ['recorded', 'interpolated', 'saccade', 'padding']
+
+#Sample of a trial, converted once from its line: time in ms, kind (see sample_kinds), trial number and gaze position.
+#Samples are written back as lines by format_line. Their positions have two decimals, except for padding samples, which repeat the position of the next sample as is.
+class Sample:
+    __slots__ = ('time', 'kind', 'trial', 'x', 'y')
+
+    def __init__(self, time, kind, trial, x, y):
+        self.time = time
+        self.kind = kind
+        self.trial = trial
+        self.x = x
+        self.y = y
+
+    def __repr__(self):
+        return 'Sample(%i, %s, %i, %r, %r)' % (self.time, self.kind, self.trial, self.x, self.y)
+
+#Returns the tokens of a line as they are written: samples are formatted, and the values of the other lines are converted to strings.
+def format_line(line):
+    if isinstance(line, Sample):
+        if line.kind == 'padding':
+            return [str(line.time), 'SMP', str(line.trial), str(line.x), str(line.y)]
+        return [str(line.time), 'SMP', str(line.trial), "{:.2f}".format(line.x), "{:.2f}".format(line.y)]
+    return [str(token) for token in line]
 
 #Gets time according to type of line
 def get_time_line(line):
-    if line[0] == "SBLINK" or line[0] == "SSACC" or line[0] == "SFIX":
+    if isinstance(line, Sample):
+        return line.time
+    elif line[0] == "SBLINK" or line[0] == "SSACC" or line[0] == "SFIX":
         return int(line[2])
     elif line[0] == "EBLINK" or line[0] == "ESACC" or line[0] == "EFIX":
         return int(line[3])
@@ -45,100 +84,100 @@ def fixation_to_string(fixation):
 def fixations_to_string(fixations):
     return '\n'.join(['fixations : '] + [fixation_to_string(fixation) for fixation in fixations])
 
-#Function to convert pixels to degrees
-def convert_px_to_degrees(size_in_px):
+def get_degrees_per_px():
     # Calculate the number of degrees that correspond to a single pixel. This will
     # generally be a very small value, something like 0.03.
-    deg_per_px = degrees(atan2(.5*size_screen, distance_ppt)) / (.5*monitor_resolution)
+    return degrees(atan2(.5*size_screen, distance_ppt)) / (.5*monitor_resolution)
+
+#Function to convert pixels to degrees
+def convert_px_to_degrees(size_in_px):
     # Calculate the size of the stimulus in degrees
-    size_in_deg = size_in_px * deg_per_px
+    size_in_deg = size_in_px * get_degrees_per_px()
     return size_in_deg
 
-#Returns X and Y coordinates of gaze position on a line
+#Returns X and Y coordinates of gaze position of a sample
 def get_point(line):
-    return [float(line[3]),float(line[4])]
-
-def barycentre_from_points(list_fix):
-    x = 0
-    y = 0
-    max_x = -1500
-    max_y = -1000
-    min_x = 1500
-    min_y = 1000
-    previous_point = None
-    counter = 0
-    for elemt in list_fix:
+    return (line.x, line.y)
+
+#Running statistics of the points of a fixation: sums, bounds and last point, updated one point at a time.
+class FixationAccumulator:
+    def __init__(self):
+        self.x = 0
+        self.y = 0
+        self.max_x = -1500
+        self.max_y = -1000
+        self.min_x = 1500
+        self.min_y = 1000
+        self.previous_point = None
+        self.counter = 0
+        # Number of fixation lines already added
+        self.n_lines = 0
+
+    def add(self, point):
         #Since we add false points at the beginning of the fixation to make saccades shorter, we don't add these make points in the barycenter calculation.
-        if previous_point == None or (previous_point != None and (previous_point[0] != float(elemt[0]) or previous_point[1] != float(elemt[1]))):
-            x += float(elemt[0])
-            y += float(elemt[1])
-            if float(elemt[0]) > max_x:
-                max_x = float(elemt[0])
-            if float(elemt[0]) < min_x:
-                min_x = float(elemt[0])
-            if float(elemt[1]) > max_y:
-                max_y = float(elemt[1])
-            if float(elemt[1]) < min_y:
-                min_y = float(elemt[1])
-            counter += 1
-            previous_point = (float(elemt[0]),float(elemt[1]))
-
-    if min_x - max_x > 50 or min_y - max_y > 50:
-        return None
-    else:
-        return (x/counter,y/counter)
-
-def compute_barycentre(lines):
-    list_points = []
-    for line in lines:
-        x = get_point(line)[0]
-        y = get_point(line)[1]
-        list_points.append((x,y))
+        if self.previous_point != None and self.previous_point[0] == point[0] and self.previous_point[1] == point[1]:
+            return
+        self.x += point[0]
+        self.y += point[1]
+        if point[0] > self.max_x:
+            self.max_x = point[0]
+        if point[0] < self.min_x:
+            self.min_x = point[0]
+        if point[1] > self.max_y:
+            self.max_y = point[1]
+        if point[1] < self.min_y:
+            self.min_y = point[1]
+        self.counter += 1
+        self.previous_point = point
+
+    def add_lines(self, lines):
+        for line in lines:
+            self.add((line.x, line.y))
+        self.n_lines += len(lines)
+
+    def barycentre(self):
+        if self.min_x - self.max_x > 50 or self.min_y - self.max_y > 50:
+            return None
+        else:
+            return (self.x/self.counter,self.y/self.counter)
 
-    return barycentre_from_points(list_points)
+#Returns the statistics of the fixation, updated with the lines appended since last call
+def get_fixation_accumulator(fixation):
+    accumulator = fixation['accumulator']
+    accumulator.add_lines(fixation['lines'][accumulator.n_lines:])
+    return accumulator
 
-#Calculates velocity between two lines in degrees. The unit is calculated between the two lines involved. Division by 1000 stands for SMI (microseconds).
-def compute_velocity_lines(line1,line2):
-    t1 = get_time_line(line1)
-    t2 = get_time_line(line2)
+#Calculates velocity between two points in degrees. The unit is calculated between the two times involved.
+def compute_velocity(t1, p1, t2, p2):
     unite = abs(t2 - t1)
-    velocity_px = distance(get_point(line1),get_point(line2))/unite
+    velocity_px = distance(p1,p2)/unite
     velocity_dg_per_ms = convert_px_to_degrees(velocity_px)
 
     return velocity_dg_per_ms
 
+#Calculates velocity between two samples in degrees.
+def compute_velocity_lines(line1,line2):
+    return compute_velocity(line1.time, get_point(line1), line2.time, get_point(line2))
+
 #Determines if a point is contained in the current fixation (from dispersion and velocity calculations)
 def point_in_fixation(fixation, current_line):
     lines = fixation['lines']
-    barycentre = compute_barycentre(lines)
+    barycentre = get_fixation_accumulator(fixation).barycentre()
     velocity = compute_velocity_lines(lines[len(lines)-1],current_line)
     return distance(barycentre,get_point(current_line)) <= min_dispersion and velocity <= min_velocity
 
-#Determines fixation duration (in order to see if it is long enough to be considered as a fixation). Division by 1000 stands for SMI (microseconds).
-def get_fixation_duration(lines):
-    if len(lines) == 0:
-        return False
-    return int(lines[len(lines)-1][0]) - int(lines[0][0])
-
-#Determines validity of fixation (from its duration)
-def is_fixation_valid(fixations):
-    lines = fixations['lines']
-    return get_fixation_duration(lines) >= min_fixation_duration
-
-#Writes line in an exportable format (string)
-def export_line(line, result_file):
-    result_file.write("\t".join(line) + "\n")
-
-#Writes fixation in an exportable format (string). Assumes that dominant eye is always right. SFIX < lines < EFIX
-def export_fixation(fixation, result_file):
-    t1 = int(fixation[0][0])
-    t2 = int(fixation[len(fixation)-1][0])
-    begin_fix = "\t".join(["SFIX","R",str(t1)]) + "\n"
-    result_file.write(begin_fix)
+#Adds line to the results
+def export_line(line, results):
+    results.append(line)
+
+#Adds fixation to the results. Assumes that dominant eye is always right. SFIX < lines < EFIX
+def export_fixation(fixation, results):
+    t1 = fixation[0].time
+    t2 = fixation[len(fixation)-1].time
+    results.append(["SFIX","R",t1])
     for line in fixation:
-        export_line(line, result_file)
-    end_fix = "\t".join(["EFIX","R",str(t1),str(t2)]) + "\n"
-    result_file.write(end_fix)
+        export_line(line, results)
+    results.append(["EFIX","R",t1,t2])
 
 def get_max_duration(unite,p1,p2):
     max_duration = abs(round(2.2*convert_px_to_degrees(distance(p1,p2)))) +21 #in ms, Carpenter, 1988
@@ -148,8 +187,8 @@ def get_max_duration(unite,p1,p2):
     return max_duration
 
 def can_add_saccade(unite, fixation1, fixation2):
-    t1 = int(fixation1[len(fixation1)-1][0])
-    t2 = int(fixation2[0][0])
+    t1 = fixation1[len(fixation1)-1].time
+    t2 = fixation2[0].time
     p1 = get_point(fixation1[len(fixation1)-1])
     p2 = get_point(fixation2[0])
     max_duration = get_max_duration(unite,p1,p2)
@@ -161,8 +200,8 @@ def can_add_saccade(unite, fixation1, fixation2):
     return n_step > 1
 
 def make_saccade_between(unite, n_trial, fixation1, fixation2):
-    t1 = int(fixation1[-1][0])
-    t2 = int(fixation2[0][0])
+    t1 = fixation1[-1].time
+    t2 = fixation2[0].time
     p1 = get_point(fixation1[-1])
     p2 = get_point(fixation2[0])
 
@@ -182,15 +221,15 @@ def make_saccade_between(unite, n_trial, fixation1, fixation2):
         #Calculates next point coordinates and writes it in the subject file
         x = p1[0] + (p2[0] - p1[0])*(i+1)/n_step
         y = p1[1] + (p2[1] - p1[1])*(i+1)/n_step
-        lines.append([str(time), 'SMP', str(n_trial+1), two_decimals(x), two_decimals(y)])
+        lines.append(Sample(time, 'saccade', n_trial+1, round_two_decimals(x), round_two_decimals(y)))
 
     return lines
 
 #Writes saccades between fixations. Saccades are "manufactured". SSACC < lines < ESACC. Works only for SMI : x 1000.
-def add_saccade_between(unite, n_trial, fixation1, fixation2, result_file):
-    logTrace('Adding saccade between %s\nand\%s' % (str(fixation1),str(fixation2)), Precision.DETAIL)
-    t1 = int(fixation1[-1][0])
-    t2 = int(fixation2[0][0])
+def add_saccade_between(unite, n_trial, fixation1, fixation2, results):
+    logTrace('Adding saccade between fixation from %ims to %ims\nand fixation from %ims to %ims' % (fixation1[0].time, fixation1[-1].time, fixation2[0].time, fixation2[-1].time), Precision.DETAIL)
+    t1 = fixation1[-1].time
+    t2 = fixation2[0].time
     p1 = get_point(fixation1[-1])
     p2 = get_point(fixation2[0])
 
@@ -198,491 +237,664 @@ def add_saccade_between(unite, n_trial, fixation1, fixation2, result_file):
 
     logTrace('Max duration : %i' % max_duration, Precision.DETAIL)
     lines = make_saccade_between(unite, n_trial, fixation1, fixation2)
-    begin_sac = "\t".join(["SSACC","R",str(t1+unite)]) + "\n"
-    result_file.write(begin_sac)
-    for line in lines:
-        s = "\t".join(line[:3] + [two_decimals(line[3]), two_decimals(line[4])]) + "\n"
-        result_file.write(s)
+    results.append(["SSACC","R",t1+unite])
+    results += lines
     if t2 - t1 > max_duration:
-        end_sac = "\t".join(["ESACC","R",lines[0][0],str(t1+max_duration-unite)]) + "\n"
+        results.append(["ESACC","R",lines[0].time,t1+max_duration-unite])
     else:
-        end_sac = "\t".join(["ESACC","R",lines[0][0], lines[len(lines)-1][0]]) + "\n"
-    result_file.write(end_sac)
+        results.append(["ESACC","R",lines[0].time, lines[len(lines)-1].time])
 
     if t2 - t1 > max_duration:
         lines_to_add = []
-        for t in range(int(lines[len(lines)-1][0]) + unite, t2, unite):
-            lines_to_add.append([str(t), 'SMP', str(n_trial+1), str(p2[0]), str(p2[1])])
+        for t in range(lines[len(lines)-1].time + unite, t2, unite):
+            lines_to_add.append(Sample(t, 'padding', n_trial+1, p2[0], p2[1]))
         return lines_to_add + fixation2
 
     else:
         return fixation2
 
-def export_fixations(unite, n_trial, fixations, result_file):
-    if len(fixations) > 0:
-        if len(fixations) == 1:
-            export_fixation(fixations[0]['lines'], result_file)
-        else:
-            if not(fixations[0]['blink_after']):
-                if can_add_saccade(unite, fixations[0]['lines'], fixations[1]['lines']):
-                    # TODO: ce test devrait prendre en compte la dispersion entre les deux fixations entières, pas seulement le premier point de la seconde fixation
-                    if point_in_fixation(fixations[0], fixations[1]['lines'][0]):
-                        # we merge the two fixations, and put the saccade in between
-                        saccade_lines = make_saccade_between(unite, n_trial,fixations[0]['lines'], fixations[1]['lines'])
-                        fixations[0]['lines'] = fixations[0]['lines'] + saccade_lines + fixations[1]['lines']
-                        fixations[0]['blink_after'] = fixations[1]['blink_after']
-                        fixations.pop(1)
-                        export_fixations(unite, n_trial, fixations, result_file)
-                    else:
-                        export_fixation(fixations[0]['lines'], result_file)
-                        fixations[1]['lines'] = add_saccade_between(unite, n_trial, fixations[0]['lines'], fixations[1]['lines'], result_file)
-                        export_fixations(unite, n_trial, fixations[1:], result_file)
-                else:
-                    fixations[0]['lines'] = fixations[0]['lines'] + fixations[1]['lines']
-                    fixations[0]['blink_after'] = fixations[1]['blink_after']
-                    fixations.pop(1)
-                    export_fixations(unite, n_trial, fixations, result_file)
+#Adds the fixations of a trial to the results, with the saccades between them. Consecutive fixations are merged when there is no room for a saccade between them, or when the next one begins inside the current one.
+#Fixations are handled one after the other: the current fixation grows in place until it is exported.
+def export_fixations(unite, n_trial, fixations, results):
+    if len(fixations) == 0:
+        return
+    current = fixations[0]
+    for fixation in fixations[1:]:
+        if current['blink_after']:
+            export_fixation(current['lines'], results)
+            current = fixation
+        elif can_add_saccade(unite, current['lines'], fixation['lines']):
+            # TODO: ce test devrait prendre en compte la dispersion entre les deux fixations entières, pas seulement le premier point de la seconde fixation
+            if point_in_fixation(current, fixation['lines'][0]):
+                # we merge the two fixations, and put the saccade in between
+                current['lines'] += make_saccade_between(unite, n_trial, current['lines'], fixation['lines']) + fixation['lines']
+                current['blink_after'] = fixation['blink_after']
             else:
-                export_fixation(fixations[0]['lines'], result_file)
-                export_fixations(unite, n_trial, fixations[1:], result_file)
+                export_fixation(current['lines'], results)
+                set_fixation_lines(fixation, add_saccade_between(unite, n_trial, current['lines'], fixation['lines'], results))
+                current = fixation
+        else:
+            current['lines'] += fixation['lines']
+            current['blink_after'] = fixation['blink_after']
+    export_fixation(current['lines'], results)
 
 def is_line_potential_blink(line):
     return (str(line[3]) == "0.00" and float(line[4]) < 10.00) or (str(line[4]) == "0.00" and float(line[3]) < 10.00)
 
-#Count the number of consecutive zero lines in a potential blink
-def count_zeros(trial,blink_beginning,blink_ending,blink_threshold):
-    count_zero = 0
-    for n_line in range(blink_beginning,blink_ending+1):
-        if is_line_potential_blink(trial[n_line]):
-            count_zero += 1
-            if count_zero >= blink_threshold:
-                return True
-        else:
-            count_zero = 0
-
-    return False
+#Same test on the positions of samples (arrays). A position is written "0.00" if it is zero, and not negative zero.
+def are_samples_potential_blinks(x, y):
+    x_zero = (x == 0) & ~np.signbit(x)
+    y_zero = (y == 0) & ~np.signbit(y)
+    return (x_zero & (y < 10.00)) | (y_zero & (x < 10.00))
 
+#Lines of the subject file with a gaze position are converted into samples (see convert_trial)
 def is_line_recording(line):
+    return isinstance(line, Sample)
+
+#Returns the sample of a line of the subject file, if it is a sample line, with its time in ms
+def get_sample(line, time):
     try:
-        float(line[3])
-        float(line[4])
-        return line[1] == "SMP"
+        if line[1] == "SMP":
+            return Sample(time, 'recorded', int(line[2]), float(line[3]), float(line[4]))
     except:
-        return False
+        pass
+    return None
 
-#Gets blinks
+#Returns the runs of consecutive True values of a boolean array, as the arrays of their beginnings and (excluded) endings.
+def get_runs(mask):
+    changes = np.flatnonzero(np.diff(np.concatenate(([False], mask, [False])).astype(np.int8)))
+    return (changes[0::2], changes[1::2])
+
+#Gets blinks. A blink is a loss of signal (positions close to zero) lasting at least min_blink_duration. It begins and ends where the velocity is stabilized (stabilization_length consecutive slow points).
+#The runs of zeros and of slow points are computed once for the whole trial, and each blink is then found by bisection on these runs.
 def get_blink(trial,unite):
-    blink_beginning = None
-    blink_ending = None
     blink_list = []
-
-    trial_filtered = [line for line in trial if is_line_recording(line)]
-
     stabilization_length = 8
 
-    for n_line in range(0,len(trial_filtered)):
-        line = trial_filtered[n_line]
-        #We are in a blink if both x and y positions equal zero or are under ten
-        if is_line_potential_blink(line):
-
-            #If both positions are under zero, it may be due to a calibration issue rather than to a blink. This remains to be verified but should be very rare.
-            if "-" in str(line[3]) and "-" in str(line[4]):
-                logTrace(line + " is this negativity odd ?", Precision.ERROR)
-
-            if blink_beginning == None :
-                velocity_stabilized_before = 0
-                velocity_stabilized_after = 0
-                blink_beginning = 0
-                blink_ending = len(trial_filtered)-1
-
-                #Calculates the beginning of the blink from velocity (needs a stabilization of 8 lines)
-                for reverse_line in reversed(range(0,n_line)):
-                    velocity = compute_velocity_lines(trial_filtered[reverse_line-1],trial_filtered[reverse_line])
-                    if velocity >= min_velocity :
-                        velocity_stabilized_before = 0
-                    else:
-                        velocity_stabilized_before +=1
-                        if velocity_stabilized_before == stabilization_length:
-                            blink_beginning = reverse_line+stabilization_length
-                            break
-
-        #We leave the blink if at least one position gets back above zero (one can remain negative). We take 10 to leave a small margin.
-        elif blink_beginning != None and not is_line_potential_blink(line):
-            #When the blink stops, calculates the ending of the blink from velocity (needs a stabilization of 8 lines)
-            velocity = compute_velocity_lines(trial_filtered[n_line-1],trial_filtered[n_line])
-            if velocity >= min_velocity :
-                velocity_stabilized_after = 0
-            else:
-                velocity_stabilized_after +=1
-                if velocity_stabilized_after == stabilization_length:
-                    blink_ending = n_line-stabilization_length
-
-        #Minimal duration of 20 ms for zeros (signal loss).
-                    if count_zeros(trial,blink_beginning,blink_ending,min_blink_duration/unite):
-                        blink_list.append((trial_filtered[blink_beginning][0],trial_filtered[blink_ending][0]))
-                    blink_beginning = None
-                    blink_ending = None
-
-    # test if blink stops at the end of the trial
-    if blink_beginning != None and count_zeros(trial,blink_beginning,blink_ending,min_blink_duration/unite):
-        blink_list.append((trial_filtered[blink_beginning][0],trial_filtered[blink_ending][0]))
+    recording = []
+    others = []
+    for (i, line) in enumerate(trial):
+        if is_line_recording(line):
+            recording.append(i)
+        else:
+            others.append(i)
+    trial_filtered = [trial[i] for i in recording]
+    (time, x, y) = get_trial_arrays(trial_filtered)
+    #We are in a blink if both x and y positions equal zero or are under ten
+    is_potential_blink = np.zeros(len(trial), dtype=bool)
+    is_potential_blink[recording] = are_samples_potential_blinks(x, y)
+    is_potential_blink[others] = [len(trial[i]) > 4 and is_line_potential_blink(trial[i]) for i in others]
+    potential_blinks = np.flatnonzero(is_potential_blink[recording])
+
+    #Velocity from the previous point (the first point is compared to the last one)
+    slow = are_velocities_below(np.roll(time, 1), np.roll(x, 1), np.roll(y, 1), time, x, y, min_velocity, strict = True)
+    (slow_begins, slow_ends) = get_runs(slow)
+    stabilized = slow_ends - slow_begins >= stabilization_length
+    (slow_begins, slow_ends) = (slow_begins[stabilized], slow_ends[stabilized])
+    #After a blink begins, only the points that are not close to zero are considered to find its end.
+    #We leave the blink if at least one position gets back above zero (one can remain negative). We take 10 to leave a small margin.
+    other_points = np.flatnonzero(~is_potential_blink[recording])
+    (other_begins, other_ends) = get_runs(slow[other_points])
+    stabilized = other_ends - other_begins >= stabilization_length
+    (other_begins, other_ends) = (other_begins[stabilized], other_ends[stabilized])
+    (zero_begins, zero_ends) = get_runs(is_potential_blink)
+
+    #Minimal duration of 20 ms for zeros (signal loss). Zeros are counted on all the lines of the trial, between the indices of the beginning and ending.
+    def has_zeros(blink_beginning, blink_ending):
+        first = np.searchsorted(zero_ends, blink_beginning, 'right')
+        last = np.searchsorted(zero_begins, blink_ending, 'right')
+        lengths = np.minimum(zero_ends[first:last], blink_ending + 1) - np.maximum(zero_begins[first:last], blink_beginning)
+        return bool(np.any(lengths >= min_blink_duration/unite))
+
+    n_potential = 0
+    while n_potential < len(potential_blinks):
+        n_line = int(potential_blinks[n_potential])
+        #Calculates the beginning of the blink from velocity: after the last stabilization before it
+        i_run = np.searchsorted(slow_begins, n_line - stabilization_length, 'right') - 1
+        blink_beginning = int(min(slow_ends[i_run], n_line)) if i_run >= 0 else 0
+
+        #Calculates the ending of the blink from velocity: before the first stabilization after it
+        first_other = int(np.searchsorted(other_points, n_line, 'right'))
+        i_run = np.searchsorted(other_ends, first_other + stabilization_length, 'left')
+        if i_run == len(other_ends):
+            # test if blink stops at the end of the trial
+            blink_ending = len(trial_filtered)-1
+            n_potential = len(potential_blinks)
+        else:
+            last_other = int(other_points[max(other_begins[i_run], first_other) + stabilization_length - 1])
+            blink_ending = last_other - stabilization_length
+            n_potential = int(np.searchsorted(potential_blinks, last_other, 'right'))
+        if has_zeros(blink_beginning, blink_ending):
+            blink_list.append((trial_filtered[blink_beginning].time,trial_filtered[blink_ending].time))
+
     return blink_list
 
+#Returns the arrays of times, x and y of the samples of a trial
+def get_trial_arrays(trial):
+    time = np.array([line.time for line in trial], dtype=np.int64)
+    x = np.array([line.x for line in trial], dtype=np.float64)
+    y = np.array([line.y for line in trial], dtype=np.float64)
+    return (time, x, y)
+
+#Returns whether the velocities from the points (t1, x1, y1) to the points (t2, x2, y2) are below the threshold (strictly if strict), as a boolean array. Velocities are computed for all the points at once.
+def are_velocities_below(t1, x1, y1, t2, x2, y2, threshold, strict = False):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        velocity = np.sqrt((x2 - x1)**2 + (y2 - y1)**2) / np.abs(t2 - t1) * get_degrees_per_px()
+    below = velocity < threshold if strict else velocity <= threshold
+    #Tests at the threshold are done again with the scalar function
+    (t1, x1, y1, t2, x2, y2) = np.broadcast_arrays(t1, x1, y1, t2, x2, y2)
+    for k in np.flatnonzero(np.abs(velocity - threshold) <= threshold_margin*threshold).tolist():
+        velocity_k = compute_velocity(int(t1[k]), (float(x1[k]), float(y1[k])), int(t2[k]), (float(x2[k]), float(y2[k])))
+        below[k] = velocity_k < threshold if strict else velocity_k <= threshold
+    return below
+
+#Returns, for each point, whether the velocity from the previous point is below min_velocity (the first point has no previous point).
+def get_slow_points(time, x, y):
+    slow = np.zeros(len(time), dtype=bool)
+    slow[1:] = are_velocities_below(time[:-1], x[:-1], y[:-1], time[1:], x[1:], y[1:], min_velocity)
+    return slow
+
+#Tries to put back the points of an invalid fixation in the previous fixation
+def put_back_points(fixation, indices, time, xs, ys):
+    accumulator = fixation['accumulator']
+    for i in indices:
+        last = fixation['indices'][-1]
+        point = (xs[i], ys[i])
+        velocity = compute_velocity(time[last], (xs[last], ys[last]), time[i], point)
+        if distance((accumulator.x/accumulator.counter, accumulator.y/accumulator.counter), point) <= min_dispersion and velocity <= min_velocity:
+            fixation['indices'].append(i)
+            accumulator.add(point)
+
+#Detects the fixations of a trial, from the times and x and y positions of its recording lines (numpy arrays) and the ending times of its blinks.
+#A point is contained in the current fixation if it is close enough to its barycentre (min_dispersion) and slow enough (min_velocity). Points close to zero are noise and are ignored. The first line after a blink begins a new fixation.
+#Noise, blinks and velocities are computed on the whole trial at once, and only the barycentres are updated point by point (with FixationAccumulator).
+#Returns the fixations as dictionaries of line indices, blink after and accumulator of their points.
+def detect_fixations(time, x, y, blink_ends):
+    fixations = []
+
+    #Lines following each blink, in order
+    boundaries = []
+    start = 0
+    for blink_end in blink_ends:
+        after = np.flatnonzero(time[start:] > blink_end)
+        if len(after) == 0:
+            break
+        start += int(after[0])
+        boundaries.append(start)
+        start += 1
+
+    #Points that may be part of fixations: points that are not noise, and lines following blinks
+    is_candidate = (x >= 10.00) | (y >= 10.00)
+    is_candidate[boundaries] = True
+    candidates = np.flatnonzero(is_candidate)
+    is_boundary = np.zeros(len(time), dtype=bool)
+    is_boundary[boundaries] = True
+    is_boundary = is_boundary[candidates].tolist()
+    slow = get_slow_points(time[candidates], x[candidates], y[candidates]).tolist()
+    time = time.tolist()
+    xs = x.tolist()
+    ys = y.tolist()
+    candidates = candidates.tolist()
+
+    def is_current_valid():
+        return len(current) > 0 and time[current[-1]] - time[current[0]] >= min_fixation_duration
+
+    def save_current(blink_after):
+        fixations.append({'blink_after' : blink_after, 'indices' : current, 'accumulator' : accumulator})
+
+    def close_fixation(blink_after):
+        if is_current_valid():
+            save_current(blink_after)
+        elif not blink_after and len(fixations) > 0 and not fixations[-1]['blink_after']:
+            # We try to put back points in the previous fixation
+            put_back_points(fixations[-1], current, time, xs, ys)
+
+    current = []
+    for (i, boundary, slow_point) in zip(candidates, is_boundary, slow):
+        px = xs[i]
+        py = ys[i]
+        if boundary:
+            #We note blinks after corresponding fixations.
+            close_fixation(True)
+        elif len(current) > 0:
+            if slow_point and sqrt(pow(px - accumulator.x/accumulator.counter, 2) + pow(py - accumulator.y/accumulator.counter, 2)) <= min_dispersion:
+                current.append(i)
+                accumulator.add((px, py))
+                continue
+            close_fixation(False)
+        current = [i]
+        accumulator = FixationAccumulator()
+        accumulator.add((px, py))
+
+    #For the last fixation
+    if is_current_valid():
+        save_current(False)
+
+    return fixations
+
 #Elements of fixation dictionary are reinitialized
 def empty_fixation():
-    return {'blink_after' : False, 'lines' : []}
+    return {'blink_after' : False, 'lines' : [], 'accumulator' : FixationAccumulator()}
 
-def linear_interpolation(unite,n_trial,line1,line2):
+#Replaces the lines of the fixation. Its statistics are computed again from the new lines.
+def set_fixation_lines(fixation, lines):
+    fixation['lines'] = lines
+    fixation['accumulator'] = FixationAccumulator()
 
-    point_list = []
-
-    t1 = int(line1[0])
-    t2 = int(line2[0])
-    p1 = get_point(line1)
-    p2 = get_point(line2)
+#Returns the times and x and y positions of the points between (t1, p1) and (t2, p2), one unite apart, or None if there is no room for them.
+def interpolate(unite, t1, p1, t2, p2):
     n_step = abs(round((int(t2-t1))/unite))
     if n_step <= 1:
         return None
-    for i in range(n_step-1):
-        #Calculates next point coordinates and appends it to the list to return
-        x = p1[0] + (p2[0] - p1[0])*(i+1)/n_step
-        y = p1[1] + (p2[1] - p1[1])*(i+1)/n_step
-        new_line = [str(t1+(unite*(i+1))), 'SMP', str(n_trial), "{:.2f}".format(x), "{:.2f}".format(y)]
-        point_list.append(new_line)
-
-    return point_list
-
-def get_file_by_name(subject_file):
-    sample = -1
-    datafile = open(subject_file,"r")
-
-    #File conversion in list.
-    data = datafile.read()
-    data = list(data.splitlines())
-
-    #We add a tabulation and space separator.
-    data = [re.split("[\t ]+",line) for line in data]
-
-    #We divide the list in a list of trials. A trial begins with a start_trial line, and ends with a stop_fixation line.
-    seq = []
-    data_seq = []
-    for e in data:
-        if len(e) > 5 and e[5] == "start_trial":
-            data_seq.append(seq)
-            seq = [e]
-        else :
-            seq.append(e)
+    steps = np.arange(1, n_step)
+    #Calculates the coordinates of all the points at once
+    x = p1[0] + (p2[0] - p1[0])*steps/n_step
+    y = p1[1] + (p2[1] - p1[1])*steps/n_step
+    return (t1 + unite*steps, x, y)
 
-    #We add the last sequence.
-    data_seq.append(seq)
-
-    #We remove what is between the end of a sequence and the beginning of another to avoid taking into account non relevant saccades.
-    for j in range(len(data_seq)):
-        seq = data_seq[j]
-        i = 1
-        for line in seq:
-            if len(line) > 5 and line[5] == "stop_trial":
-                break
-            i += 1
-        data_seq[j] = seq[:i]
-
-    data = data_seq
-
-    first_seq = data[0]
-    data = data[1:]
-
-    return data
+def linear_interpolation(unite,n_trial,line1,line2):
+    points = interpolate(unite, line1.time, get_point(line1), line2.time, get_point(line2))
+    if points is None:
+        return None
+    (time, x, y) = points
+    return [Sample(t, 'interpolated', n_trial, round_two_decimals(x_i), round_two_decimals(y_i)) for (t, x_i, y_i) in zip(time.tolist(), x.tolist(), y.tolist())]
+
+#Returns the position of the first point after start that is reached slowly enough from the anchor (max_velocity) to end an artifact, and the number of artifacted points before it.
+#The position is None if the artifact lasts until the end of the trial.
+def find_artifact_end(unite, time, x, y, anchor, start):
+    n_artifacts = 0
+    window = 64
+    while start < len(time):
+        end = min(start + window, len(time))
+        below = are_velocities_below(time[anchor], x[anchor], y[anchor], time[start:end], x[start:end], y[start:end], max_velocity, strict = True)
+        #The artifact ends on a correct point only if there is room for the interpolated points
+        n_step = np.abs(np.round((time[start:end] - time[anchor])/unite))
+        ends = np.flatnonzero(below & (n_step > 1))
+        if len(ends) > 0:
+            return (start + int(ends[0]), n_artifacts + int(np.count_nonzero(~below[:ends[0]])))
+        n_artifacts += int(np.count_nonzero(~below))
+        start = end
+        window *= 2
+    return (None, n_artifacts)
+
+#Removes the artifacts of a trial, from its recording lines and their times and x and y positions (numpy arrays).
+#A point is an artifact if it is reached too fast (max_velocity) from the last correct point. Artifacts are replaced by the linear interpolation between the correct points around them. If the trial ends on an artifact, its last points are removed.
+#Returns the lines and arrays of the filtered trial, and the number of artifacts.
+def remove_artifacts(unite, n_trial, lines, time, x, y):
+    #Velocities between consecutive points: the artifacts begin where they are too high
+    fast = ~are_velocities_below(time[:-1], x[:-1], y[:-1], time[1:], x[1:], y[1:], max_velocity, strict = True)
+    artifact_begins = np.flatnonzero(fast) + 1
+    #Kept lines and arrays, piece by piece
+    line_pieces = []
+    pieces = []
+    artifact_count = 0
+    begin = 0
+    while True:
+        i_artifact = np.searchsorted(artifact_begins, begin + 1)
+        if i_artifact == len(artifact_begins):
+            line_pieces.append(lines[begin:])
+            pieces.append((time[begin:], x[begin:], y[begin:]))
+            break
+        anchor = int(artifact_begins[i_artifact]) - 1
+        line_pieces.append(lines[begin:anchor+1])
+        pieces.append((time[begin:anchor+1], x[begin:anchor+1], y[begin:anchor+1]))
+        (end, n_artifacts) = find_artifact_end(unite, time, x, y, anchor, anchor + 2)
+        artifact_count += 1 + n_artifacts
+        if end == None:
+            break
+        #The interpolated points have two decimals, as they are written
+        interpolated = linear_interpolation(unite, n_trial, lines[anchor], lines[end])
+        line_pieces.append(interpolated)
+        pieces.append(get_trial_arrays(interpolated))
+        begin = end
+
+    lines = [line for piece in line_pieces for line in piece]
+    (time, x, y) = (np.concatenate(column) for column in zip(*pieces))
+    return (lines, time, x, y, artifact_count)
+
+#Reads the subject file one trial at a time, and yields the lines of each trial (split on tabulations and spaces).
+#A trial begins with a start_trial line, and ends with a stop_trial line: what is between the end of a trial and the beginning of the next one is not taken into account, to avoid non relevant saccades. So is what is before the first trial.
+def read_trials(subject_file):
+    trial = None
+    stopped = False
+    with openFile(subject_file,"r") as datafile:
+        for file_line in datafile:
+            for line in file_line.splitlines():
+                line = re.split("[\t ]+",line)
+                if len(line) > 5 and line[5] == "start_trial":
+                    if trial is not None:
+                        yield trial
+                    trial = [line]
+                    stopped = False
+                elif trial is not None and not stopped:
+                    trial.append(line)
+                    stopped = len(line) > 5 and line[5] == "stop_trial"
+
+    if trial is not None:
+        yield trial
 
 def get_unit_pre_transfo(trial):
+    def get_first_time(line):
+        if is_line_recording(line):
+            return line.time
+        return int(line[0])
+
     for i in range(1,len(trial)):
         try:
-            return int(trial[i+1][0]) - int(trial[i][0])
+            return get_first_time(trial[i+1]) - get_first_time(trial[i])
         except:
             continue
 
     return None
 
-def processSubject(subject_file: str, result_file : str, progress = None) -> None :
-    createTmpFolder()
-    data = get_file_by_name(subject_file)
-
-    data_1000 = []
-    data_filtered = []
-    data_filtered2 = []
-    artifact_percentage = []
-
-    #We transform microseconds into milliseconds.
-
-    if progress != None:
-        progress.setText(1, 'Loading Trials - preprocessing: reading file')
-        progress.setMaximum(1, len(data))
-
-    for trial in data:
-        if progress != None:
-            progress.increment(1)
-
-        trial_1000 = []
-        last_time = None
-
-        for line in trial:
-            try:
-                int(line[0])
-                new_time = round(int(line[0])/1000)
-                #We make sure that every recording line has a different time.
-                if is_line_recording(line):
-                    if last_time == None :
-                        last_time = new_time
-                    else:
-                        if last_time == new_time :
-                            new_time += 1
-                        last_time = new_time
-
-                new_line = [str(new_time)] + line[1:]
-                trial_1000.append(new_line)
-
-            except:
-                trial_1000.append(line)
+#Converts the lines of a trial: sample lines become samples, and we transform microseconds into milliseconds.
+def convert_trial(trial):
+    trial_1000 = []
+    last_time = None
 
-        data_1000.append(trial_1000)
-
-    #Gets unite from calculation between two lines
-    unite = get_unit_pre_transfo(data_1000[0])
-
-    if progress != None:
-        progress.setText(1, 'Loading Trials - preprocessing: blink removal')
-        progress.setMaximum(1, len(data_1000)-1)
+    for line in trial:
+        try:
+            new_time = round(int(line[0])/1000)
+        except:
+            trial_1000.append(line)
+            continue
 
-    total_blinks = {}
-    # Blink removal
-    for n_trial in range(len(data_1000)):
-        if progress != None:
-            progress.increment(1)
-
-        trial = data_1000[n_trial]
-
-        blinks = get_blink(trial,unite)
-        total_blinks[str(n_trial)] = [blink for blink in blinks]
-
-        logTrace('Blinks were retrieved. Here is the list \n ' + str(blinks), Precision.NORMAL)
-        print_message = True
-        trial_filtered = []
-        for line in trial:
-            if is_line_recording(line):
-                t = get_time_line(line)
-                #If time is superior to beginning time of first element of blink list, we must print the beginning of the blink.
-                if len(blinks) > 0 and t >= int(blinks[0][0]):
-                    if print_message:
-                        mess = ["SBLINK", "R", blinks[0][0]]
-                        trial_filtered.append(mess)
-                        print_message = False
-
-                    #If time is superior to ending time of first element of blink list, we print the ending of the blink.
-                    if t > int(blinks[0][1]):
-                        mess = ["EBLINK", "R", blinks[0][0], blinks[0][1]]
-                        trial_filtered.append(mess)
-                        print_message = True
-                        blinks.pop(0)
-                else:
-                    trial_filtered.append(line)
+        sample = get_sample(line, new_time)
+        if sample is not None:
+            #We make sure that every recording line has a different time.
+            if last_time == None :
+                last_time = new_time
             else:
-                if len(line) > 8 and line[6] == "sujet" and line[8] == "repondu" and not print_message and int(blinks[0][1]) < int(line[0]):
-                    mess = ["EBLINK", "R", blinks[0][0], blinks[0][1]]
+                if last_time == new_time :
+                    sample.time += 1
+                last_time = sample.time
+            trial_1000.append(sample)
+        else:
+            trial_1000.append([str(new_time)] + line[1:])
+
+    return trial_1000
+
+#Replaces the recording lines of the blinks by SBLINK and EBLINK lines
+def remove_blinks(trial, blinks):
+    blinks = list(blinks)
+    print_message = True
+    trial_filtered = []
+    for line in trial:
+        if is_line_recording(line):
+            t = line.time
+            #If time is superior to beginning time of first element of blink list, we must print the beginning of the blink.
+            if len(blinks) > 0 and t >= blinks[0][0]:
+                if print_message:
+                    mess = ["SBLINK", "R", blinks[0][0]]
                     trial_filtered.append(mess)
-                    print_message = True
-                    blinks.pop(0)
+                    print_message = False
 
-                elif len(line) > 5 and line[5]== "stop_trial" and not print_message:
+                #If time is superior to ending time of first element of blink list, we print the ending of the blink.
+                if t > blinks[0][1]:
                     mess = ["EBLINK", "R", blinks[0][0], blinks[0][1]]
                     trial_filtered.append(mess)
-                trial_filtered.append(line)
-
-        data_filtered.append(trial_filtered)
-
-    if progress != None:
-        progress.setText(1, 'Loading Trials - preprocessing: artifact removal')
-        progress.setMaximum(1, len(data_filtered))
-
-    messages = []
-    n_trial = 0
-    #Removing artifacts
-    for trial in data_filtered:
-        #Artifacts indicator (will provide a percentage to see if the trial is worth keeping)
-        artifact_count = 0
-        nb_lines = 0
-        n_trial += 1
-        previous_not_artifacted_line = None
-        post_added_line = 0
-        trial_filtered = []
-        point_list = []
-        artifact_got = False
-
-        if progress != None:
-            progress.increment(1)
-
-        for i_line in range (0,len(trial)):
-            if is_line_recording(trial[i_line]):
-                nb_lines += 1
-                current_line = trial[i_line]
-
-                if previous_not_artifacted_line == None:
-                    previous_not_artifacted_line = current_line
-
-                #We compute the velocity between the previous point and the current
-                elif not artifact_got:
-                    velocity = compute_velocity_lines(previous_not_artifacted_line,current_line)
-
-                #If the velocity is above the threshold, we add the previous points to the list and look for the next point without artifact.
-                    if velocity >= max_velocity:
-                        artifact_got = True
-                        artifact_count += 1
-                        for elt in range (post_added_line,i_line):
-                            if is_line_recording(trial[elt]):
-                                trial_filtered.append(trial[elt])
-                            post_added_line = i_line
-                    else:
-                        previous_not_artifacted_line = current_line
-
-                elif artifact_got:
-                    velocity = compute_velocity_lines(previous_not_artifacted_line,current_line)
-
-                    #Once we have found a correct point, we do the linear interpolation and add the created points to the list. We then go back to the initial for loop.
-                    if velocity < max_velocity :
-                        point_list = linear_interpolation(unite,n_trial,previous_not_artifacted_line,current_line)
-                        if point_list != None:
-                            for elt in point_list:
-                                trial_filtered.append(elt)
-                            post_added_line = i_line
-                            previous_not_artifacted_line = current_line
-                            artifact_got = False
-                            point_list = []
-                    else:
-                        artifact_count += 1
-
+                    print_message = True
+                    blinks.pop(0)
             else:
-                messages.append(trial[i_line])
-
-        #We add the end of the trial
-        for line in trial[post_added_line:]:
-            if not artifact_got and is_line_recording(line):
                 trial_filtered.append(line)
-
-        data_filtered2.append(trial_filtered)
-
-        #If our trial has no valid lines (blink trials).
-        if nb_lines > 0:
-            artifact_percentage.append((artifact_count/nb_lines)*100)
         else:
-            artifact_percentage.append(0)
+            if len(line) > 8 and line[6] == "sujet" and line[8] == "repondu" and not print_message and blinks[0][1] < int(line[0]):
+                mess = ["EBLINK", "R", blinks[0][0], blinks[0][1]]
+                trial_filtered.append(mess)
+                print_message = True
+                blinks.pop(0)
+
+            elif len(line) > 5 and line[5]== "stop_trial" and not print_message:
+                mess = ["EBLINK", "R", blinks[0][0], blinks[0][1]]
+                trial_filtered.append(mess)
+            trial_filtered.append(line)
+
+    return trial_filtered
+
+#Blink stage of a trial in milliseconds: returns its blinks, and the trial where their lines are replaced by SBLINK and EBLINK lines.
+def blink_stage(unite, trial):
+    blinks = get_blink(trial,unite)
+    logTrace('Blinks were retrieved. Here is the list \n ' + str(blinks), Precision.NORMAL)
+    return (blinks, remove_blinks(trial, blinks))
+
+#Artifact stage of a trial (n_trial from 0) without blinks: returns its recording lines without artifacts (with their arrays), its other lines and its percentage of artifacts.
+def artifact_stage(unite, n_trial, trial):
+    recording_lines = []
+    messages = []
+    for line in trial:
+        if is_line_recording(line):
+            recording_lines.append(line)
+        else:
+            messages.append(line)
 
-    if progress != None:
-        progress.setText(1, 'Loading Trials - preprocessing: writing file')
-        progress.setMaximum(1, len(data_filtered2)-1)
+    (time, x, y) = get_trial_arrays(recording_lines)
+    (trial_filtered, time, x, y, artifact_count) = remove_artifacts(unite, n_trial+1, recording_lines, time, x, y)
 
-    results = open(joinPaths(getTmpFolder(), get_inter_filename()), "w")
-    for n_trial in range(len(data_filtered2)):
-        if progress != None:
-            progress.increment(1)
+    #Artifacts indicator (provides a percentage to see if the trial is worth keeping). If our trial has no valid lines (blink trials), it is 0.
+    if len(recording_lines) > 0:
+        artifact_percentage = (artifact_count/len(recording_lines))*100
+    else:
+        artifact_percentage = 0
 
-        trial = data_filtered2[n_trial]
+    return ((trial_filtered, time, x, y), messages, artifact_percentage)
 
-        fixations = []
+#Fixation stage of a trial (n_trial from 0): returns the lines of its fixations and saccades. The recording lines are not modified.
+def fixation_stage(unite, n_trial, blinks, recording):
+    (trial_filtered, time, x, y) = recording
+    blink_ends = [blink[1] for blink in blinks]
+    fixations = []
+    for fixation in detect_fixations(time, x, y, blink_ends):
         current_fixation = empty_fixation()
+        current_fixation['blink_after'] = fixation['blink_after']
+        current_fixation['lines'] = [trial_filtered[i] for i in fixation['indices']]
+        #The points of the lines are already in the accumulator
+        current_fixation['accumulator'] = fixation['accumulator']
+        current_fixation['accumulator'].n_lines = len(current_fixation['lines'])
+        fixations.append(current_fixation)
+
+    logTrace("Exporting fixations", Precision.NORMAL)
+    logTrace(fixations_to_string(fixations), Precision.DETAIL)
+    lines = []
+    export_fixations(unite, n_trial, fixations, lines)
+    return lines
 
-        for line in trial:
-            t = get_time_line(line)
-
-            #We note blinks after corresponding fixations.
-            if len(total_blinks[str(n_trial)]) > 0 and t > int(total_blinks[str(n_trial)][0][1]):
-                logTrace('Blink encountered: ' + str(line), Precision.DETAIL)
-                current_fixation['blink_after'] = True
-                total_blinks[str(n_trial)].pop(0)
-                logTrace('Saving fixation', Precision.NORMAL)
-                logTrace('fixation : ' + str(current_fixation), Precision.DETAIL)
-                if is_fixation_valid(current_fixation):
-                    fixations.append(current_fixation)
-                current_fixation = empty_fixation()
-                current_fixation['lines'] = [line]
-
-            #We determine for each line if it is contained within the same fixation.
-            #We do not consider negative or close to zero lines, for they are often noise.
+#Preprocesses a trial (n_trial from 0): samples with times in milliseconds, blinks, artifacts, fixations and saccades. Trials are preprocessed independently from each other.
+#Returns the lines of its fixations and saccades, its other lines (messages, to put back at the right place) and its percentage of artifacts.
+def preprocess_trial(unite, n_trial, trial):
+    trial = convert_trial(trial)
+    (blinks, trial) = blink_stage(unite, trial)
+    (recording, messages, artifact_percentage) = artifact_stage(unite, n_trial, trial)
+    return (fixation_stage(unite, n_trial, blinks, recording), messages, artifact_percentage)
+
+#Returns the detection parameters, to be given to set_parameters
+def get_parameters():
+    return {name : globals()[name] for name in parameter_names}
+
+def set_parameters(parameters):
+    globals().update(parameters)
+
+#Applies function(unite, n_trial, trial, *arguments) to the trials as they are read (n_trial from 0), and yields the results in the order of the trials.
+#Trials are processed in the calling process by default (see getPreprocessingProcesses). If n_processes is more than 1, they are sent to a pool of n_processes processes, a few at a time: only the trials being processed are kept in memory. Processes are given the current parameters.
+#Starting the processes takes longer than preprocessing a usual subject: the pool is worth it for long subjects or parameter sweeps. The caller must then be importable (if __name__ == '__main__').
+def map_trials(function, unite, trials, arguments = (), progress = None, n_processes = None):
+    if n_processes is None:
+        n_processes = getPreprocessingProcesses()
+    if n_processes <= 1:
+        for (n_trial, trial) in enumerate(trials):
+            yield function(unite, n_trial, trial, *arguments)
+            if progress != None:
+                progress.increment(1)
+        return
+
+    # Processes are spawned rather than forked, since the GUI is running.
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(n_processes, mp_context = context, initializer = set_parameters, initargs = (get_parameters(),)) as executor:
+        pending = deque()
+        for (n_trial, trial) in enumerate(trials):
+            pending.append(executor.submit(function, unite, n_trial, trial, *arguments))
+            if len(pending) >= 2*n_processes:
+                yield pending.popleft().result()
+                if progress != None:
+                    progress.increment(1)
+        while len(pending) > 0:
+            yield pending.popleft().result()
+            if progress != None:
+                progress.increment(1)
+
+#Returns the lines that are written for a message. The unit and percentage of artifacts of the trial are written on its first line.
+def expand_message(unite, message, artifact_percentages):
+    if len(message) > 5 and message[5] == "start_trial":
+        return [message + [" Unite "] + [str(unite)] + [" Artifact_percentage "] + [str(artifact_percentages.popleft())] + [" %"]]
+    elif len(message) > 5 and message[5] == "stop_trial":
+        return [[str(int(message[0]) - 1)] + message[1:5] + ["features:"] + message[6:], message[:6]]
+    return [message]
+
+#Puts the messages of the preprocessed trials back at the right place, as the trials come: a message is put before the first line which is not before it.
+#Messages keep their order: a message without time follows the previous one.
+#Lines and messages are kept only until their place is known.
+def merge_messages(unite, trials):
+    lines = deque()
+    messages = deque()
+    artifact_percentages = deque()
+    message_time = -1
+    for (trial_lines, trial_messages, artifact_percentage) in trials:
+        lines.extend(trial_lines)
+        for message in trial_messages:
+            if message[0] == "SBLINK":
+                message_time = int(message[2])
+            elif message[0] == "EBLINK":
+                message_time = int(message[3])
+            elif len(message) > 1 and message[1] == "MSG":
+                message_time = int(message[0])
+            messages.append((message_time, message))
+        artifact_percentages.append(artifact_percentage)
+
+        while len(lines) > 0 and len(messages) > 0:
+            if messages[0][0] <= get_time_line(lines[0]):
+                yield from expand_message(unite, messages.popleft()[1], artifact_percentages)
             else:
-                if float(line[3]) < 10.00 and float(line[4]) < 10.00:
-                    continue
-                elif current_fixation['lines'] == []:
-                    current_fixation['lines'] = [line]
-                elif (point_in_fixation(current_fixation, line)):
-                    current_fixation['lines'].append(line)
-                else:
-                    logTrace('Point %s not in fixation' % str(get_point(line)), Precision.NORMAL)
-                    logTrace('Saving fixation', Precision.NORMAL)
-                    logTrace('fixation : ' + str(current_fixation), Precision.DETAIL)
-                    if is_fixation_valid(current_fixation):
-                        fixations.append(current_fixation)
-                    elif len(fixations) > 0 and not fixations[-1]['blink_after']:
-                        # We try to put back points in the previous fixation
-                        for line2 in current_fixation['lines']:
-                            if point_in_fixation(fixations[-1], line2):
-                                fixations[-1]['lines'].append(line2)
-                    current_fixation = empty_fixation()
-                    current_fixation['lines'] = [line]
-
-        #For the last fixation
-        if is_fixation_valid(current_fixation):
-            fixations.append(current_fixation)
-
-        # Writing fixations in file
-        logTrace("Exporting fixations", Precision.NORMAL)
-        logTrace(fixations_to_string(fixations), Precision.DETAIL)
-        export_fixations(unite, n_trial, fixations, results)
-    results.close()
-
-    #Writing messages at the right place
-    results_inter = open(joinPaths(getTmpFolder(), get_inter_filename()),"r")
-    results = open(joinPaths(getTmpFolder(), result_file),"w")
-
-    #Converting file in list
-    data = results_inter.read()
-    data = list(data.splitlines())
-    data = [re.split("[\t ]+",line) for line in data]
-    results_inter.close()
-
-    min_message = 0
-
-    def print_message(message : str) -> None :
-        if len(message) > 5 and message[5] == "start_trial":
-        #We write the unit on the first line of the trial.
-            mess = message + [" Unite "] + [str(unite)] + [" Artifact_percentage "] + [str(artifact_percentage[0])] + [" %"]
-            artifact_percentage.pop(0)
-            results.write("\t".join(mess) + "\n")
-        elif len(message) > 5 and message[5] == "stop_trial":
-            mess1 = [str(int(message[0]) - 1)] + message[1:5] + ["features:"] + message[6:]
-            mess2 = message[:6]
-            results.write("\t".join(mess1) + "\n")
-            results.write("\t".join(mess2) + "\n")
-        else:
-            results.write("\t".join(message) + "\n")
+                yield lines.popleft()
 
-    if progress != None:
-        progress.setText(1, 'Loading Trials - preprocessing: putting back messages')
-        progress.setMaximum(1, len(data)-1)
+    for (_, message) in messages:
+        yield from expand_message(unite, message, artifact_percentages)
+    yield from lines
 
-    for line in data:
+#Preprocesses the subject file: blinks, artifacts, fixations and saccades are computed again from the samples.
+#The file is read one trial at a time, and the lines of each trial are yielded once it is preprocessed, before the next trials are read (see map_trials).
+#Yields the lines of the preprocessed subject: samples, and lists of tokens for the other lines. They are written by export_lines.
+def preprocessSubject(subject_file: str, progress = None, n_processes: int = None) -> Iterator[Union[Sample, list]] :
+    trials = read_trials(subject_file)
+    first_trial = next(trials, None)
+    if first_trial is None:
+        return
 
-        if progress != None:
-            progress.increment(1)
+    #Gets unite from calculation between two lines
+    unite = get_unit_pre_transfo(convert_trial(first_trial))
 
-        t = get_time_line(line)
-        for n in range(min_message,len(messages)):
-            message = messages[n]
-            if len(message) > 0 and (message[0] == "SBLINK" and t >= int(message[2])) or (message[0] == "EBLINK" and t >= int(message[3])) or (message[1] == "MSG" and t >= int(message[0])):
-                min_message += 1
-                print_message(message)
-        results.write("\t".join(line) + "\n")
+    if progress != None:
+        # The number of trials is not known before the end of the file
+        progress.setText(1, 'Loading Trials - preprocessing')
+        progress.setMaximum(1, 0)
+
+    trials = map_trials(preprocess_trial, unite, chain([first_trial], trials), progress = progress, n_processes = n_processes)
+    yield from merge_messages(unite, trials)
 
+#Writes the lines of a preprocessed subject in a text file
+def export_lines(lines, result_file):
+    with open(result_file, "w") as results:
+        for line in lines:
+            results.write("\t".join(format_line(line)) + "\n")
 
-    # Printing last messages
-    for n in range(min_message,len(messages)):
-        message = messages[n]
-        print_message(message)
+#Preprocesses the subject file, and writes the result in the temporary folder, one trial at a time.
+def processSubject(subject_file: str, result_file : str, progress = None) -> None :
+    createTmpFolder()
+    export_lines(preprocessSubject(subject_file, progress), joinPaths(getTmpFolder(), result_file))
+
+#Returns the parameter sets of a grid: every combination of the given values of each parameter (e.g. {'min_dispersion' : [30.0, 40.0]}).
+def get_parameter_grid(values):
+    names = list(values.keys())
+    return [dict(zip(names, combination)) for combination in product(*[values[name] for name in names])]
+
+#Returns the statistics of the preprocessed lines of a trial, for the sweep.
+def get_sweep_statistics(blinks, artifact_percentage, lines):
+    events = [line for line in lines if not is_line_recording(line)]
+    fixation_durations = [line[3] - line[2] for line in events if line[0] == "EFIX"]
+    n_saccades = sum(1 for line in events if line[0] == "ESACC")
+    return (len(fixation_durations), sum(fixation_durations), n_saccades, len(blinks), artifact_percentage)
+
+#Preprocesses a trial (n_trial from 0) with each parameter set, and returns its statistics for each of them.
+#Stages are computed once for all the sets that share the parameters they depend on.
+def sweep_trial(unite, n_trial, trial, parameter_sets):
+    trial = convert_trial(trial)
+    blink_stages = {}
+    artifact_stages = {}
+    statistics = []
+    parameters = get_parameters()
+    try:
+        for parameter_set in parameter_sets:
+            set_parameters(parameter_set)
+            blink_key = tuple(parameter_set[name] for name in blink_parameter_names)
+            if blink_key not in blink_stages:
+                blink_stages[blink_key] = blink_stage(unite, trial)
+            (blinks, trial_blinks) = blink_stages[blink_key]
+
+            artifact_key = blink_key + tuple(parameter_set[name] for name in artifact_parameter_names)
+            if artifact_key not in artifact_stages:
+                artifact_stages[artifact_key] = artifact_stage(unite, n_trial, trial_blinks)
+            (recording, _, artifact_percentage) = artifact_stages[artifact_key]
+
+            lines = fixation_stage(unite, n_trial, blinks, recording)
+            statistics.append(get_sweep_statistics(blinks, artifact_percentage, lines))
+    finally:
+        set_parameters(parameters)
+    return statistics
+
+#Preprocesses the subject file with each parameter set (parameters that are not given keep their current value, see get_parameter_grid), one trial at a time (in a pool of n_processes processes, see map_trials).
+#Returns, for each set, its complete parameters and the statistics of its fixations, saccades, blinks and artifacts over the trials.
+def sweepSubject(subject_file: str, parameter_sets: List[dict], progress = None, n_processes: int = None) -> List[dict] :
+    for parameter_set in parameter_sets:
+        for name in parameter_set:
+            if name not in parameter_names:
+                raise KeyError('Unknown preprocessing parameter %s' % name)
+    parameter_sets = [dict(get_parameters(), **parameter_set) for parameter_set in parameter_sets]
+
+    trials = read_trials(subject_file)
+    first_trial = next(trials, None)
+    totals = [[0, 0, 0, 0, 0] for parameter_set in parameter_sets]
+    n_trials = 0
+    if first_trial is not None:
+        unite = get_unit_pre_transfo(convert_trial(first_trial))
 
-    results.close()
+        if progress != None:
+            progress.setText(1, 'Loading Trials - parameter sweep')
+            progress.setMaximum(1, 0)
+
+        for statistics in map_trials(sweep_trial, unite, chain([first_trial], trials), (parameter_sets,), progress, n_processes):
+            for (total, trial_statistics) in zip(totals, statistics):
+                for i in range(len(total)):
+                    total[i] += trial_statistics[i]
+            n_trials += 1
+
+    results = []
+    for (parameter_set, total) in zip(parameter_sets, totals):
+        (n_fixations, fixation_duration, n_saccades, n_blinks, artifact_percentage) = total
+        results.append({
+            'parameters' : parameter_set,
+            'n_fixations' : n_fixations,
+            'total_fixation_duration' : fixation_duration,
+            'mean_fixation_duration' : fixation_duration/n_fixations if n_fixations > 0 else 0,
+            'n_saccades' : n_saccades,
+            'n_blinks' : n_blinks,
+            'mean_artifact_percentage' : artifact_percentage/n_trials if n_trials > 0 else 0
+        })
+    return results
+
+#Writes the results of sweepSubject as a table (csv, separated by ';'), one line per parameter set. Only the parameters that vary are written.
+def export_sweep(results, result_file):
+    names = [name for name in parameter_names if len(set(result['parameters'][name] for result in results)) > 1]
+    columns = ['n_fixations', 'mean_fixation_duration', 'total_fixation_duration', 'n_saccades', 'n_blinks', 'mean_artifact_percentage']
+    with open(result_file, "w") as table:
+        table.write(';'.join(names + columns) + "\n")
+        for result in results:
+            values = [result['parameters'][name] for name in names] + [result[column] for column in columns]
+            table.write(';'.join([str(value) for value in values]) + "\n")
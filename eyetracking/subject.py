@@ -13,18 +13,37 @@ class Subject:
         self.id = id
         # subject group
         self.group = group
+        # validation reports of the trials skipped because of errors
+        self.skipped_trials = []
 
         if progress != None:
             progress.setText(1, 'Loading Trials: parsing entries')
             progress.setMaximum(1, n_trials)
 
         logTrace ('Parsing trials entries', Precision.TITLE)
-        while lines != []:
+        # Each line is read once: every trial consumes its own lines from the stream.
+        lines = LineStream(lines)
+        # Trials waiting for a line giving their eye
+        unknown_eye = []
+        while not lines.isEmpty():
             trial = Trial(eyetracker)
-            lines = trial.setEntries(lines)
+            trial_lines = trial.setEntries(lines)
+            # The eye of a trial is given by its lines, or else by the next ones.
+            eye = eyetracker.getEye(trial_lines)
+            if eye is not None:
+                for previous_trial in unknown_eye:
+                    previous_trial.eye = eye
+                unknown_eye = []
+            if not trial.isEmpty():
+                trial.eye = eye
+                if eye is None:
+                    unknown_eye.append(trial)
             try:
                 logTrace ('Checking trial validity', Precision.NORMAL)
-                trial.checkValid()
+                report = trial.validate()
+                if not report.isValid():
+                    self.skipped_trials.append(report)
+                    raise TrialException(report.errors[0])
                 if not trial.isEmpty():
                     if trial.isTraining():
                         self.training_trials.append(trial)
@@ -37,6 +56,9 @@ class Subject:
                 continue
 
 
+    def setId(self, id: int) -> None:
+        self.id = id
+
     def getTrial(self, trial_number : int):
         for trial in self.trials:
             if trial.getTrialId() == trial_number:
@@ -1,9 +1,11 @@
 from eyetracking.eyetracker import *
 from eyetracking.interest_region import *
 from eyetracking.utils import *
+from eyetracking.samples import *
 from eyetracking.scanpath import plotSegment
-from typing import TypeVar, List
+from typing import TypeVar, List, Iterable, Iterator
 from math import sqrt, pow
+from collections import deque, OrderedDict
 
 class TrialException(Exception):
     def __init__(self, message):
@@ -14,12 +16,140 @@ class TrialException(Exception):
 # Type of a line in the eyetracking result file
 Line = List[str]
 
+class TrialReport:
+    """
+    Result of the validation of a trial (see Trial.validate).
+    The trial is valid if no error was found. Warnings are only logged.
+    """
+    def __init__(self, trial: 'Trial'):
+        self.trial = str(trial)
+        self.errors = []
+        self.warnings = []
+
+    def __str__(self):
+        return '%s%s' % (self.trial, '\n'.join(self.errors))
+
+    def isValid(self) -> bool:
+        return len(self.errors) == 0
+
+    def addError(self, message: str) -> None:
+        self.errors.append(message)
+
+    # Errors on times of entry lists are warnings, unless stated otherwise (see EntryList).
+    def addTimeError(self, message: str) -> None:
+        if EntryList.ENTRYLISTEXCEPTION_WARNING:
+            logTrace(message, Precision.ERROR)
+            self.warnings.append(message)
+        else:
+            self.addError(message)
+
+class LineStream:
+    """
+    Iterator over the lines of a subject file, each line being read once.
+    Trials consume the lines they need from the stream, and may put back
+    the lines that belong to the next trial.
+    """
+    def __init__(self, lines: Iterable[Line]):
+        self.lines = iter(lines)
+        # Lines put back, or read from self.lines but not consumed yet
+        self.buffer = deque()
+
+    def __iter__(self) -> Iterator[Line]:
+        return self
+
+    def __next__(self) -> Line:
+        if self.buffer:
+            return self.buffer.popleft()
+        return next(self.lines)
+
+    # Puts back a consumed line at the head of the stream.
+    def pushBack(self, line: Line) -> None:
+        self.buffer.appendleft(line)
+
+    def isEmpty(self) -> bool:
+        if self.buffer:
+            return False
+        for line in self.lines:
+            self.buffer.append(line)
+            return False
+        return True
+
+# Entry lists of the last inspected trials (see Trial.getEntries)
+materialized_trials = OrderedDict()
+max_materialized_trials = 8
+
+class TrialEntries:
+    """
+    Sequence of the entries of a trial. Entries are made from the columns
+    of the trial when they are accessed.
+    """
+    def __init__(self, trial: 'Trial'):
+        self.trial = trial
+
+    def __len__(self) -> int:
+        return len(self.trial.time)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.trial.getEntry(j) for j in range(*i.indices(len(self)))]
+        return self.trial.getEntry(i)
+
+    def __setitem__(self, i: int, entry: Entry) -> None:
+        self.trial.setEntry(i, entry)
+
+    def __iter__(self) -> Iterator[Entry]:
+        events = self.trial.events
+        time = self.trial.time.tolist()
+        x = self.trial.x.tolist()
+        y = self.trial.y.tolist()
+        for i in range(len(time)):
+            entry = events.get(i)
+            if entry is None:
+                entry = Position(time[i], x[i], y[i])
+            yield entry
+
+class TimeIndex:
+    """
+    Times of entries in increasing order, to find the entries of a time
+    window by bisection. Times of valid trials are already sorted; otherwise
+    the entries are sorted first.
+    """
+    def __init__(self, time: np.ndarray):
+        # Order of the entries by time, None if they are in order
+        self.order = None
+        self.time = time
+        if np.any(time[:-1] > time[1:]):
+            self.order = np.argsort(time, kind = 'stable')
+            self.time = time[self.order]
+
+    # Returns the indices of the entries such that t0 <= time < t1, in increasing order.
+    def getIndices(self, t0: int, t1: int) -> np.ndarray:
+        begin = np.searchsorted(self.time, t0, 'left')
+        end = np.searchsorted(self.time, t1, 'left')
+        if self.order is None:
+            return np.arange(begin, end)
+        return np.sort(self.order[begin:end])
+
+    # Returns the indices of the entries such that t < time, in time order.
+    def getIndicesAfter(self, t: int) -> np.ndarray:
+        begin = np.searchsorted(self.time, t, 'right')
+        if self.order is None:
+            return np.arange(begin, len(self.time))
+        return self.order[begin:]
+
 class Trial:
     def __init__(self, eyetracker):
         # Eyetracker
         self.eyetracker = eyetracker
-        # List of entries
-        self.entries = []
+        # Entries, in columns: time, gaze position (NaN if the entry is not a
+        # position) and kind (see entry_kinds) of each entry.
+        # Entries are accessed through the entries attribute (see TrialEntries).
+        self.time = np.zeros(0, dtype = np.int64)
+        self.x = np.zeros(0)
+        self.y = np.zeros(0)
+        self.kind = np.zeros(0, dtype = np.int8)
+        # Entries other than positions, by index
+        self.events = {}
         # Dictionary of trial features
         self.features = None
         # List of saccades
@@ -32,6 +162,22 @@ class Trial:
         # Either "Left" or "Right"
         self.eye = None
 
+        # Index of the entries (see indexEntries)
+        self.i_first_position = None
+        self.i_last_position = None
+        # First entry after the start trial that is not a position
+        self.i_first_event = None
+        self.i_response = None
+        self.i_stop_trial = None
+        self.i_features = []
+        # Indices of the messages, by text
+        self.i_messages = {}
+        # Indices of entries and events by time, and of fixations, saccades
+        # and blinks, made when first needed (see getTimeIndex)
+        self.time_index = None
+        self.event_index = None
+        self.entry_list_indices = {}
+
         # Is the trial discarded
         self.discarded = False
 
@@ -44,118 +190,374 @@ class Trial:
         for entry in self.entries:
             print(entry)
 
-    def setEntries(self, lines: List[Line]) -> List[Line]:
+    @property
+    def entries(self) -> TrialEntries:
+        return TrialEntries(self)
+
+    # Returns the list of all entries of the trial, for inspection: changing
+    # them does not change the trial. The lists of the last inspected trials
+    # are kept, the others are made again when needed.
+    def getEntries(self) -> List[Entry]:
+        entries = materialized_trials.get(self)
+        if entries is None:
+            entries = list(self.entries)
+            materialized_trials[self] = entries
+            if len(materialized_trials) > max_materialized_trials:
+                materialized_trials.popitem(last = False)
+        else:
+            materialized_trials.move_to_end(self)
+        return entries
+
+    def getEntry(self, i: int) -> Entry:
+        if i < 0:
+            i += len(self.time)
+        if i < 0 or i >= len(self.time):
+            raise IndexError('Entry %i out of range' % i)
+        entry = self.events.get(i)
+        if entry is None:
+            entry = Position(self.time[i].item(), self.x[i].item(), self.y[i].item())
+        return entry
+
+    # Replaces the entry at index i.
+    def setEntry(self, i: int, entry: Entry) -> None:
+        materialized_trials.pop(self, None)
+        self.clearTimeIndex()
+        if i < 0:
+            i += len(self.time)
+        kind = getKind(entry)
+        self.time[i] = entry.getTime()
+        if type(entry) == Position:
+            self.events.pop(i, None)
+            (self.x[i], self.y[i]) = entry.getGazePosition()
+        else:
+            self.events[i] = entry
+            (self.x[i], self.y[i]) = (np.nan, np.nan)
+        if kind != self.kind[i] or kind != position_kind:
+            self.kind[i] = kind
+            self.indexEntries()
+
+    ################## Time queries ##################
+
+    def clearTimeIndex(self) -> None:
+        self.time_index = None
+        self.event_index = None
+        self.entry_list_indices = {}
+
+    def getTimeIndex(self) -> TimeIndex:
+        if self.time_index is None:
+            self.time_index = TimeIndex(self.time)
+        return self.time_index
+
+    # Returns the indices of the entries such that t0 <= time < t1.
+    def getEntriesBetween(self, t0: int, t1: int) -> np.ndarray:
+        return self.getTimeIndex().getIndices(t0, t1)
+
+    # Returns the indices of the positions such that t0 <= time < t1.
+    def getPositionsBetween(self, t0: int, t1: int) -> np.ndarray:
+        indices = self.getEntriesBetween(t0, t1)
+        return indices[self.kind[indices] == position_kind]
+
+    # Returns the first entry other than a position, of the given class, after time t.
+    def getFirstEventAfter(self, t: int, klass = Entry) -> Union[Entry, None]:
+        if self.event_index is None:
+            events = np.flatnonzero(self.kind != position_kind)
+            self.event_index = (events, TimeIndex(self.time[events]))
+        (events, index) = self.event_index
+        for i in index.getIndicesAfter(t).tolist():
+            entry = self.getEntry(events[i].item())
+            if isinstance(entry, klass):
+                return entry
+        return None
+
+    # Returns the index of the fixations, saccades or blinks (given by name).
+    # It is made again if the list changed.
+    def getEntryListIndex(self, name: str) -> EntryListIndex:
+        entry_lists = getattr(self, name)
+        index = self.entry_list_indices.get(name)
+        if index is None or index.entry_lists is not entry_lists or len(index) != len(entry_lists):
+            index = EntryListIndex(entry_lists)
+            self.entry_list_indices[name] = index
+        return index
+
+    # Returns the fixations overlapping the window [t0, t1].
+    def getFixationsBetween(self, t0: int, t1: int) -> List[Fixation]:
+        return self.getEntryListIndex('fixations').getOverlapping(t0, t1)
+
+    def getSaccadesBetween(self, t0: int, t1: int) -> List[Saccade]:
+        return self.getEntryListIndex('saccades').getOverlapping(t0, t1)
+
+    def getBlinksBetween(self, t0: int, t1: int) -> List[Blink]:
+        return self.getEntryListIndex('blinks').getOverlapping(t0, t1)
+
+    def getGazePosition(self, i: int) -> Point:
+        return (self.x[i].item(), self.y[i].item())
+
+    # Sets the columns of the entries from a list of entries and SampleBlocks.
+    def setColumns(self, pieces: List[Union[Entry, SampleBlock]]) -> None:
+        chunks = ([], [], [], [])
+        # Entries not put in chunks yet
+        rows = ([], [], [], [])
+        def flush():
+            if len(rows[0]) > 0:
+                chunks[0].append(np.array(rows[0], dtype = np.int64))
+                chunks[1].append(np.array(rows[1], dtype = np.float64))
+                chunks[2].append(np.array(rows[2], dtype = np.float64))
+                chunks[3].append(np.array(rows[3], dtype = np.int8))
+                for row in rows:
+                    row.clear()
+
+        materialized_trials.pop(self, None)
+        self.clearTimeIndex()
+        self.events = {}
+        n_entries = 0
+        for piece in pieces:
+            if isinstance(piece, SampleBlock):
+                flush()
+                chunks[0].append(piece.time)
+                chunks[1].append(piece.x)
+                chunks[2].append(piece.y)
+                chunks[3].append(np.full(piece.size(), position_kind, dtype = np.int8))
+                n_entries += piece.size()
+                continue
+            rows[0].append(piece.getTime())
+            if type(piece) == Position:
+                rows[1].append(piece.x)
+                rows[2].append(piece.y)
+            else:
+                self.events[n_entries] = piece
+                rows[1].append(np.nan)
+                rows[2].append(np.nan)
+            rows[3].append(getKind(piece))
+            n_entries += 1
+        flush()
+
+        if len(chunks[0]) > 0:
+            (self.time, self.x, self.y, self.kind) = [np.concatenate(chunk) for chunk in chunks]
+
+    # Consumes the lines of the trial from the given stream.
+    # Returns the consumed lines, apart from samples. The eye is not set here,
+    # since it may only be given after the trial (see Subject).
+    def setEntries(self, lines: LineStream) -> List[Line]:
         logTrace ('Parsing entries', Precision.NORMAL)
-        rest_lines = self.parseEntries(lines)
+        trial_lines = self.parseEntries(lines)
+        self.indexEntries()
         if not self.isEmpty():
             logTrace ('Setting trial features', Precision.NORMAL)
             self.setFeatures()
-            logTrace ('Setting eye', Precision.NORMAL)
-            self.eye = self.eyetracker.getEye(lines)
             logTrace ('Setting if trial is training', Precision.NORMAL)
             self.is_training = self.eyetracker.isTraining(self)
-        return rest_lines
+        return trial_lines
+
+    # Indexes the entries in one pass, so that the accessors below do not scan them.
+    # It must be called again if entries are added or removed.
+    def indexEntries(self) -> None:
+        self.i_first_position = None
+        self.i_last_position = None
+        self.i_first_event = None
+        self.i_response = None
+        self.i_stop_trial = None
+        self.i_features = []
+        self.i_messages = {}
+        positions = np.flatnonzero(self.kind == position_kind)
+        if len(positions) > 0:
+            self.i_first_position = positions[0].item()
+            self.i_last_position = positions[-1].item()
+        events = np.flatnonzero(self.kind[1:] != position_kind)
+        if len(events) > 0:
+            self.i_first_event = events[0].item() + 1
+        for i in sorted(self.events):
+            entry = self.events[i]
+            if isinstance(entry, Response):
+                if self.i_response is None:
+                    self.i_response = i
+            elif isinstance(entry, StopTrial):
+                self.i_stop_trial = i
+            elif isinstance(entry, TrialFeatures):
+                self.i_features.append(i)
+            elif isinstance(entry, Message):
+                self.i_messages.setdefault(entry.message, []).append(i)
 
     def isEmpty(self) -> bool:
-        for entry in self.entries:
-            if isinstance(entry, Position):
-                return False
-        return True
+        return self.i_first_position is None
 
     def isTraining(self) -> bool:
         return self.is_training
 
     # Raises an exception if one of the condition is not fulfilled.
     def checkValid(self) -> None:
-        if self.entries == None:
-            raise TrialException('Entries attribute is None')
-        if type(self.entries) != list:
-            raise TrialException('Entries attribute is not a list')
-        if len(self.entries) < 2:
-            raise TrialException('Entries attribute is too small')
-
-        if not isinstance(self.entries[0], StartTrial):
-            raise TrialException('First entry is not a start trial')
-        if not isinstance(self.entries[-1], StopTrial):
-            raise TrialException('Last entry is not a stop trial')
-
-        for saccade in self.saccades:
-            saccade.check()
-        for fixation in self.fixations:
-            fixation.check()
-        for blink in self.blinks:
-            blink.check()
-
-    # Parses the given list of lines, to fill the entries attribute.
-    # Return the rest of the lines
-    def parseEntries(self, lines : List[Line]) -> List[Line]:
+        report = self.validate()
+        if not report.isValid():
+            raise TrialException(report.errors[0])
+
+    def validate(self) -> TrialReport:
+        """
+        Checks the entries, on their columns: types, times, start and stop
+        trial, and the entries beginning and ending saccades, fixations and
+        blinks.
+        """
+        report = TrialReport(self)
+        n = len(self.time)
+        if len(self.x) != n or len(self.y) != n or len(self.kind) != n:
+            report.addError('Entry columns have different lengths')
+            return report
+        if not np.issubdtype(self.time.dtype, np.integer):
+            report.addError('Times are not int')
+        if self.x.dtype != np.float64 or self.y.dtype != np.float64:
+            report.addError('Coordinates are not float')
+        # Entries other than positions check their own attributes
+        for i in sorted(self.events):
+            try:
+                self.events[i].check()
+            except EntryException as e:
+                report.addError(str(e))
+
+        if n < 2:
+            report.addError('Entries attribute is too small')
+            return report
+        if self.kind[0] != kind_codes[StartTrial]:
+            report.addError('First entry is not a start trial')
+        if self.kind[-1] != kind_codes[StopTrial]:
+            report.addError('Last entry is not a stop trial')
+
+        # Entries i such that time[i] > time[i+1]
+        decreasing = np.flatnonzero(self.time[:-1] > self.time[1:])
+        for (name, entry_lists, start, end, timed) in [
+            ('saccade', self.saccades, StartSaccade, EndSaccade, True),
+            ('fixation', self.fixations, StartFixation, EndFixation, True),
+            ('blink', self.blinks, StartBlink, EndBlink, False)]:
+            if len(entry_lists) == 0:
+                continue
+            begins = np.array([entry_list.begin for entry_list in entry_lists])
+            ends = np.array([entry_list.end for entry_list in entry_lists])
+            valid = np.ones(len(entry_lists), dtype = bool)
+            if timed:
+                valid = ends - begins > 1
+                for i in np.flatnonzero(~valid):
+                    report.addError('Entry list is too short')
+                # Time must increase for all lines except the first and last ones.
+                first_decreasing = np.searchsorted(decreasing, begins + 1)
+                last_decreasing = np.searchsorted(decreasing, ends - 2)
+                bad_first = self.time[begins + 1] - self.time[begins] > 2
+                bad_last = self.time[ends] - self.time[ends - 1] > 2
+                for i in np.flatnonzero(valid & ((last_decreasing > first_decreasing) | bad_first | bad_last)):
+                    entry_list = entry_lists[i]
+                    for j in decreasing[first_decreasing[i]:last_decreasing[i]].tolist():
+                        report.addTimeError('Time is decreasing between %s and %s' % (
+                            str(self.getEntry(j)), str(self.getEntry(j + 1))))
+                    if bad_first[i]:
+                        report.addTimeError('Incorrect time for the first line: %s' % entry_list.entries_to_string())
+                    if bad_last[i]:
+                        report.addTimeError('Incorrect time for the last line %s' % str(self.getEntry(entry_list.end)))
+            for i in np.flatnonzero(valid & (self.kind[begins] != kind_codes[start])):
+                report.addError('First entry is not a start %s' % name)
+            for i in np.flatnonzero(valid & (self.kind[ends] != kind_codes[end])):
+                report.addError('Last entry is not a stop %s' % name)
+        return report
+
+    # Consumes the lines of the given stream up to the end of the trial, to fill the entries attribute.
+    # Returns the consumed lines, apart from samples
+    def parseEntries(self, lines : LineStream) -> List[Line]:
+        # Entries and blocks of samples, put in columns at the end
+        pieces = []
         #Number of entries
+        n_entries = 0
         begin_saccade = None
         begin_fixation = None
         begin_blink = None
+        # Blinks ended before the stop trial entry, kept if they are long enough
+        blinks = []
         started = False
-        i_line = -1
+        trial_lines = []
         for line in lines:
-            i_line += 1
+            if isinstance(line, SampleBlock):
+                if started:
+                    pieces.append(line)
+                    n_entries += line.size()
+                continue
+            trial_lines.append(line)
             entry = self.eyetracker.parseEntry(line)
             if entry != None:
                 if isinstance(entry, StartTrial):
                     started = True
                 if started:
-                    entry.check()
-                    self.entries.append(entry)
+                    pieces.append(entry)
+                    n_entries += 1
                     #We are looking for entries with the same time as the stop trial entry
                     if isinstance(entry, StopTrial):
-                        for line in lines[i_line + 1:]:
+                        for line in lines:
+                            if isinstance(line, SampleBlock):
+                                # Samples with the same time as the stop trial entry are inserted before it
+                                different_times = np.flatnonzero(line.time != entry.getTime())
+                                n_same = different_times[0] if len(different_times) > 0 else line.size()
+                                if n_same > 0:
+                                    pieces.insert(len(pieces)-1, line.slice(0, n_same))
+                                    n_entries += n_same
+                                if n_same < line.size():
+                                    lines.pushBack(line.slice(n_same))
+                                    break
+                                continue
                             entry2 = self.eyetracker.parseEntry(line)
                             if entry2 != None and entry2.getTime() == entry.getTime():
-                                self.entries.insert(len(self.entries)-1, entry2)
+                                pieces.insert(len(pieces)-1, entry2)
+                                n_entries += 1
                                 if begin_saccade is not None and isinstance(entry2, EndSaccade):
-                                    self.saccades.append(Saccade(self, begin_saccade, len(self.entries) - 2))
+                                    self.saccades.append(Saccade(self, begin_saccade, n_entries - 2))
                                     begin_saccade = None
                                 elif begin_fixation is not None and isinstance(entry2, EndFixation):
-                                    self.fixations.append(Fixation(self, begin_fixation, len(self.entries) - 2))
+                                    self.fixations.append(Fixation(self, begin_fixation, n_entries - 2))
                                     begin_fixation = None
                                 elif begin_blink is not None and isinstance(entry2, EndBlink):
-                                    self.blinks.append(Blink(self, begin_blink, len(self.entries) - 2))
+                                    self.blinks.append(Blink(self, begin_blink, n_entries - 2))
                                     begin_blink = None
                             elif entry2 != None and entry2.getTime() != entry.getTime():
+                                # This line belongs to the next trial
+                                lines.pushBack(line)
                                 break
-                            i_line += 1
-                        return lines[i_line + 1:]
+                            trial_lines.append(line)
+                        break
 
                     if isinstance(entry, StartSaccade):
-                        begin_saccade = len(self.entries) - 1
+                        begin_saccade = n_entries - 1
                     elif isinstance(entry, StartFixation):
-                        begin_fixation = len(self.entries) - 1
+                        begin_fixation = n_entries - 1
                     elif isinstance(entry, StartBlink):
-                        begin_blink = len(self.entries) - 1
+                        begin_blink = n_entries - 1
 
                     if begin_saccade is not None and isinstance(entry, EndSaccade):
-                        self.saccades.append(Saccade(self, begin_saccade, len(self.entries) - 1))
+                        self.saccades.append(Saccade(self, begin_saccade, n_entries - 1))
                         begin_saccade = None
                     elif begin_fixation is not None and isinstance(entry, EndFixation):
-                        self.fixations.append(Fixation(self, begin_fixation, len(self.entries) - 1))
+                        self.fixations.append(Fixation(self, begin_fixation, n_entries - 1))
                         begin_fixation = None
                     elif begin_blink is not None and isinstance(entry, EndBlink):
-                        current_blink = Blink(self, begin_blink, len(self.entries) - 1)
-                        if current_blink.isBlinkValid():
-                            self.blinks.append(current_blink)
+                        blinks.append(Blink(self, begin_blink, n_entries - 1))
                         begin_blink = None
-        return []
+        self.setColumns(pieces)
+        self.blinks = [blink for blink in blinks if blink.isBlinkValid()] + self.blinks
+        return trial_lines
 
     def getFirstGazePosition(self) -> Union[Entry,None]:
-        for entry in self.entries:
-            if isinstance(entry, Position):
-                return entry
-        return None
+        if self.i_first_position is None:
+            return None
+        return self.entries[self.i_first_position]
+
+    def getLastGazePosition(self) -> Union[Entry,None]:
+        if self.i_last_position is None:
+            return None
+        return self.entries[self.i_last_position]
+
+    # Returns the index of the first message containing the given text, or None.
+    def findMessage(self, text: str) -> Union[int, None]:
+        indices = [i_messages[0] for (message, i_messages) in self.i_messages.items() if text in message]
+        if len(indices) == 0:
+            return None
+        return min(indices)
 
     def setFeatures(self) -> None:
         self.features = {}
-        for entry in self.entries:
-            if isinstance(entry, TrialFeatures):
-                for (k,v) in entry.features.items():
-                    self.features[k] = v
+        for i in self.i_features:
+            for (k,v) in self.entries[i].features.items():
+                self.features[k] = v
 
     # Returns the Start_trial entry of the trial.
     # The trial is assumed to be valid (see checkValid()).
@@ -172,11 +574,9 @@ class Trial:
 
     #Returns the line where the subject gives a manual response (or where the trial ends).
     def getResponse(self) -> Union[Entry, None]:
-        for entry in self.entries:
-            if isinstance(entry, Response):
-                return entry
-
-        return None
+        if self.i_response is None:
+            return None
+        return self.entries[self.i_response]
 
     # Returns the trial id
     # The trial is assumed to be valid (see checkValid()).
@@ -194,14 +594,10 @@ class Trial:
         last_gaze_entry = None
         saccade_first = False
         # Check if a saccade had begun before the trial start
-        for entry in self.entries[1:]:
-            if isinstance(entry, EndSaccade):
-                saccade_first = True
-                break
-            elif isinstance(entry, Position):
-                last_gaze_entry = entry
-            else:
-                break
+        if self.i_first_event is not None and isinstance(self.entries[self.i_first_event], EndSaccade):
+            saccade_first = True
+            if self.i_first_event > 1:
+                last_gaze_entry = self.entries[self.i_first_event - 1]
 
         if saccade_first:
             if distance(last_gaze_entry.getGazePosition(), screen_center) > valid_distance_center:
@@ -249,44 +645,47 @@ class Trial:
         # We create a copy to be able to remove elements
         blink_list = [blink for blink in self.blinks]
 
-        for fixation in self.fixations:
-            if (end_line is not None and fixation.begin < end_line) or end_line is None:
-                blink_encountered = False
-                barycentre = fixation.barycentre()
-                watched_region = regions.point_inside(barycentre)
-
-                for blink in blink_list:
-                    if fixation.getStartTime() > blink.getEndTime():
-                        blink_list.remove(blink)
-                        blink_encountered = True
-                        break
-
-                # If we find no corresponding frame, we determine the closer one. If its distance to the fixation is shorter enough, we take this frame.
-                # if watched_region == None:
-                #     closest_region = regions.find_minimal_distance(barycentre)
-                #     # maximum distance allowed between a point and a region
-                #     max_dist = sqrt(pow(closest_region.half_width, 2) + pow(closest_region.half_height,2)) + 10
-                #     if distance(closest_region.center, barycentre) < max_dist:
-                #         watched_region = closest_region
-
-                # If we change of frame or encounter a blink, we end the previous fixation and add it to our list.
-                if current_region_fixation.begin != None and (watched_region != current_region_fixation.region or blink_encountered):
-                    set_type_fixation(current_region_fixation)
-                    current_region_fixation.on_target = (target_region == current_region_fixation.region)
-
-                    if current_region_fixation.type == "NORMAL":
-                        region_fixations.append(current_region_fixation)
-
-                    current_region_fixation = initialize_region_fixation()
-
-                if current_region_fixation.begin == None and watched_region != None:
-                    current_region_fixation.begin = fixation.getBegin()
-                    current_region_fixation.region = watched_region
-                    current_region_fixation.end = fixation.getEnd()
-
-                # If we already have a fixation and are still in it, we continue it and just change the ending point.
-                elif current_region_fixation.begin != None and watched_region == current_region_fixation.region:
-                    current_region_fixation.end = fixation.getEnd()
+        # Fixations beginning before end_line
+        fixations = self.fixations
+        if end_line is not None:
+            fixations = self.getEntryListIndex('fixations').getBeginningBefore(end_line)
+        for fixation in fixations:
+            blink_encountered = False
+            barycentre = fixation.barycentre()
+            watched_region = regions.point_inside(barycentre)
+
+            for blink in blink_list:
+                if fixation.getStartTime() > blink.getEndTime():
+                    blink_list.remove(blink)
+                    blink_encountered = True
+                    break
+
+            # If we find no corresponding frame, we determine the closer one. If its distance to the fixation is shorter enough, we take this frame.
+            # if watched_region == None:
+            #     closest_region = regions.find_minimal_distance(barycentre)
+            #     # maximum distance allowed between a point and a region
+            #     max_dist = sqrt(pow(closest_region.half_width, 2) + pow(closest_region.half_height,2)) + 10
+            #     if distance(closest_region.center, barycentre) < max_dist:
+            #         watched_region = closest_region
+
+            # If we change of frame or encounter a blink, we end the previous fixation and add it to our list.
+            if current_region_fixation.begin != None and (watched_region != current_region_fixation.region or blink_encountered):
+                set_type_fixation(current_region_fixation)
+                current_region_fixation.on_target = (target_region == current_region_fixation.region)
+
+                if current_region_fixation.type == "NORMAL":
+                    region_fixations.append(current_region_fixation)
+
+                current_region_fixation = initialize_region_fixation()
+
+            if current_region_fixation.begin == None and watched_region != None:
+                current_region_fixation.begin = fixation.getBegin()
+                current_region_fixation.region = watched_region
+                current_region_fixation.end = fixation.getEnd()
+
+            # If we already have a fixation and are still in it, we continue it and just change the ending point.
+            elif current_region_fixation.begin != None and watched_region == current_region_fixation.region:
+                current_region_fixation.end = fixation.getEnd()
 
         # For the last region_fixation
         if current_region_fixation.begin != None:
@@ -311,18 +710,14 @@ class Trial:
             return []
 
     def getGazePoints(self, end_line = None) -> List[Point] :
-        point_list = []
-        for count, entry in enumerate(self.entries):
-            if end_line is not None and count >= end_line:
-                break
-            if isinstance(entry, Response):
-                break
-            else:
-                point = entry.getGazePosition()
-                if point is not None:
-                    point_list.append(point)
-
-        return point_list
+        # Points before the response
+        end = len(self.time)
+        if end_line is not None:
+            end = min(end, max(end_line, 0))
+        if self.i_response is not None:
+            end = min(end, self.i_response)
+        positions = np.flatnonzero(self.kind[:end] == position_kind)
+        return list(zip(self.x[positions].tolist(), self.y[positions].tolist()))
 
     # Plot the trial on the current image
     def plot(self, frequency: int, end_line = None):
@@ -1,6 +1,6 @@
 from typing import Tuple
 from math import pow, sqrt
-import os, shutil
+import bz2, gzip, lzma, os, shutil
 
 # Type for points describing gaze positions on the screen.
 Point = Tuple[int,int]
@@ -14,6 +14,37 @@ def joinPaths(path1: str, path2: str) -> str:
 def squareSum(score: float, global_mean: float):
     return (float(score) - global_mean)*(float(score) - global_mean)
 
+# Subject files may be compressed with gzip, bzip2 or xz. They are recognized
+# by their first bytes, and decompressed as a stream when read.
+compressed_formats = [
+    (b'\x1f\x8b', gzip.open),
+    (b'BZh', bz2.open),
+    (b'\xfd7zXZ\x00', lzma.open)
+]
+
+def getOpener(input_file: str):
+    with open(input_file, 'rb') as f:
+        magic = f.read(6)
+    for (prefix, opener) in compressed_formats:
+        if magic.startswith(prefix):
+            return opener
+    return None
+
+def isCompressed(input_file: str) -> bool:
+    return getOpener(input_file) is not None
+
+def openFile(input_file: str, mode: str = 'r'):
+    """
+    Opens a file for reading, decompressing it on the fly if needed.
+    mode is 'r' (text) or 'rb' (bytes).
+    """
+    opener = getOpener(input_file)
+    if opener is None:
+        return open(input_file, mode)
+    if mode == 'r':
+        mode = 'rt'
+    return opener(input_file, mode)
+
 def getTmpFolder() -> str:
     return '_tmp'
 
@@ -25,6 +56,37 @@ def createTmpFolder() -> None:
     if not os.path.exists(getTmpFolder()):
         os.makedirs(getTmpFolder())
 
+# Maximum number of processes used to parse subjects in parallel (None: one
+# per CPU). Trials are preprocessed in a pool only when it is set.
+max_processes = None
+
+def getMaxProcesses() -> int:
+    if max_processes is None:
+        return os.cpu_count() or 1
+    return max_processes
+
+def setMaxProcesses(n: int) -> None:
+    global max_processes
+    max_processes = n
+
+# Number of processes used to preprocess the trials of a subject (see
+# smi_correction.map_trials): one unless setMaxProcesses was called, since the
+# scripts using the pool must be importable (if __name__ == '__main__').
+# Subjects parsed in parallel preprocess their trials in their own process.
+def getPreprocessingProcesses() -> int:
+    if max_processes is None:
+        return 1
+    return max_processes
+
+# Folder of the parsed subjects (see eyetracking.cache). Unlike the
+# temporary folder, it is kept between sessions.
+def getCacheFolder() -> str:
+    return '_cache'
+
+def createCacheFolder() -> None:
+    if not os.path.exists(getCacheFolder()):
+        os.makedirs(getCacheFolder())
+
 def getResultsFolder() -> str:
     return '_results'
 
@@ -7,6 +7,8 @@ from PyQt5.QtCore import *
 
 from eyetracking.smi import *
 from eyetracking.subject import Subject
+from eyetracking.trial import materialized_trials
+from eyetracking.experiment import suggestExperiments
 from gui.utils import *
 from gui.subject import *
 from gui.progress_widget import ProgressWidget
@@ -207,11 +209,13 @@ class Main(QMainWindow):
         ag.setExclusive(True)
         self.experiment_menu = menubar.addMenu('&Experiment')
 
+        self.experiment_actions = dict()
         for exp_name in self.experiments:
             setExp = QAction('&' + exp_name, self, checkable = True)
             setExp.triggered.connect(self.setExperiment(exp_name))
             a = ag.addAction(setExp)
             self.experiment_menu.addAction(a)
+            self.experiment_actions[exp_name] = setExp
 
         #Default experiment: the last one
         setExp.setChecked(True)
@@ -273,6 +277,8 @@ class Main(QMainWindow):
         reply = messagebox.exec_()
         if reply == QMessageBox.Yes:
             self.subject_datas = []
+            # Entries of the trials inspected
+            materialized_trials.clear()
             self.subject_buttons = QButtonGroup()
             self.subject_buttons.setExclusive(True)
             # Disabling Save menu action
@@ -305,6 +311,17 @@ class Main(QMainWindow):
             logTrace ('Experiment %s loaded' % self.experiment, Precision.TITLE)
         return f
 
+    # Selects an experiment that can read the file, if the current one cannot.
+    # Only possible while no subject is loaded.
+    def suggestExperiment(self, filename: str) -> None:
+        if len(self.subject_datas) > 0 or self.getExperiment().fits(filename):
+            return
+        names = suggestExperiments(self.experiments, filename)
+        logTrace ('Experiments fitting file %s: %s' % (filename, ', '.join(names)), Precision.NORMAL)
+        if len(names) == 1:
+            self.experiment_actions[names[0]].setChecked(True)
+            self.setExperiment(names[0])()
+
     def setFrequency(self, frequency : int):
         def set():
             self.frequency = frequency
@@ -323,6 +340,7 @@ class Main(QMainWindow):
         if len(filenames) > 0:
             # Storing new default data folder
             self.dataDirectory = '/'.join(filenames[0].split('/')[0:-1])
+            self.suggestExperiment(filenames[0])
             # Enabling Save menu action
             self.exportAct.setEnabled(True)
             # Disabling change of experiment
@@ -335,9 +353,15 @@ class Main(QMainWindow):
             progress.setMaximum(0, len(filenames))
             for filename in filenames:
                 logTrace ('Reading subject file %s' % filename, Precision.INPUT)
+            try:
+                # Subject files are parsed in parallel
+                subjects = self.getExperiment().processSubjects(filenames, progress)
+            except Exception as e:
+                raise Exception('Files could not be read:\n%s' % traceback.format_exc())
 
+            for (filename, subject) in zip(filenames, subjects):
                 try:
-                    subject = SubjectData(self.getExperiment(), filename, self.frequency, progress)
+                    subject = SubjectData(self.getExperiment(), subject, self.frequency)
                     self.subject_datas.append(subject)
 
                     # Adding subject button
@@ -354,7 +378,6 @@ class Main(QMainWindow):
                     button.setCheckable(True)
                     self.subjecttrialScrollLayout.addWidget(button)
                     button.clicked.connect(self.make_choose_subject(n_subject))
-                    progress.increment(0)
 
                 except Exception as e:
                     raise Exception('File %s could not be read:\n%s' % (filename, traceback.format_exc()))
@@ -475,7 +498,7 @@ class Main(QMainWindow):
             logTrace ('choosing trial', Precision.NORMAL)
             self.clear_layouts()
 
-            for entry in trial.entries:
+            for entry in trial.getEntries():
                 self.logOutput.append(str(entry))
             sb = self.logOutput.verticalScrollBar()
             sb.setValue(sb.minimum())
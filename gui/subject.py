@@ -36,11 +36,12 @@ class TrialData:
         self.image = None
 
 class SubjectData:
-    def __init__(self, experiment, input_file: str, frequency, progress = None):
+    # subject: as parsed by experiment.processSubject(s)
+    def __init__(self, experiment, subject, frequency):
         self.training_trial_datas = []
         self.trial_datas = []
         self.experiment = experiment
-        self.subject = self.experiment.processSubject(input_file, progress)
+        self.subject = subject
 
         for trial in self.subject.training_trials:
             self.training_trial_datas.append(TrialData(self.experiment, self.subject, trial, frequency))
@@ -0,0 +1,31 @@
+# Regression check of the SMI preprocessing: data/VisualSearch_23.txt is
+# preprocessed again and compared with its expected output, so that fixation,
+# saccade and blink boundaries do not change silently.
+# After an intended change of the preprocessing, run with --update to store
+# the new expected output.
+import difflib, gzip, os, sys
+
+from eyetracking.smi_correction import preprocessSubject, format_line
+
+folder = os.path.dirname(os.path.abspath(__file__))
+subject_file = os.path.join(folder, 'data', 'VisualSearch_23.txt')
+expected_file = os.path.join(folder, 'data', 'VisualSearch_23_preprocessed.txt.gz')
+
+lines = ['\t'.join(format_line(line)) for line in preprocessSubject(subject_file)]
+
+if '--update' in sys.argv[1:]:
+    with gzip.open(expected_file, 'wt') as f:
+        f.write(''.join(line + '\n' for line in lines))
+    print('Expected output updated: %i lines' % len(lines))
+    sys.exit(0)
+
+with gzip.open(expected_file, 'rt') as f:
+    expected = f.read().splitlines()
+
+if lines != expected:
+    diff = difflib.unified_diff(expected, lines, 'expected', 'preprocessed', lineterm = '')
+    print('\n'.join(list(diff)[:50]))
+    print('Preprocessing of %s changed' % subject_file)
+    sys.exit(1)
+
+print('Preprocessing OK: %i lines' % len(lines))
@@ -0,0 +1,14 @@
+# Checks of the entry indices of trials (see Trial.indexEntries)
+import sys
+
+from eyetracking.trial import *
+
+# The first message containing the text is found, even if a later message is exactly the text.
+trial = Trial(None)
+trial.setColumns([Position(0, 1.0, 1.0), Message(1, 'End image showing 2'), Position(2, 1.0, 1.0), Message(3, 'End image showing')])
+trial.indexEntries()
+if trial.findMessage('End image showing') != 1 or trial.findMessage('showing 2') != 1 or trial.findMessage('Start') is not None:
+    print('findMessage returned %s' % trial.findMessage('End image showing'))
+    sys.exit(1)
+
+print('Trial indices OK')